@@ -0,0 +1,165 @@
+"""
+Run grade_user concurrently against recorded grader traffic.
+
+Record real traffic by setting ``record_grader_traffic`` in the XBlock
+settings (see gradefetcher/recording.py), then run from the repository root:
+
+    DJANGO_SETTINGS_MODULE=test_settings PYTHONPATH=. python \
+        benchmarks/bench_grade_user_replay.py benchmarks/recordings/sample.jsonl \
+        --calls 200 --speed 10
+
+By default there are as many threads as the limiter admits (max concurrent
+calls plus the admission queue). A call turned away as busy waits for its
+``retry_after``, as gradefetcher.js makes the learner do, and is tried again;
+rejections are reported apart from the calls that completed.
+"""
+import argparse
+import json
+import logging
+import threading
+import time
+
+import django
+from mock import Mock
+from xblock.field_data import DictFieldData
+
+django.setup()
+
+from gradefetcher import pools  # noqa: E402
+from gradefetcher.gradefetcher import GradeFetcherXBlock  # noqa: E402
+from gradefetcher.limits import (  # noqa: E402
+    DEFAULT_ADMISSION_QUEUE_SIZE,
+    limiter_metrics,
+)
+from gradefetcher.recording import ReplayAdapter  # noqa: E402
+
+
+def endpoints(path):
+    """The recorded auth and grader endpoints"""
+    auth_endpoint = grader_endpoint = ""
+    with open(path) as recording:
+        for line in recording:
+            exchange = json.loads(line)
+            url = exchange["endpoint"].split(" ", 1)[1]
+            if exchange["method"] == "POST":
+                auth_endpoint = url
+            else:
+                grader_endpoint = url
+    return auth_endpoint, grader_endpoint
+
+
+def make_block(auth_endpoint, grader_endpoint, settings_bucket):
+    runtime = Mock(
+        service=Mock(
+            side_effect=lambda block, name: {
+                "i18n": Mock(gettext=lambda text: text),
+                "settings": Mock(get_settings_bucket=Mock(return_value=settings_bucket)),
+            }[name]
+        ),
+        anonymous_student_id="anonymous",
+    )
+    block = GradeFetcherXBlock(runtime, DictFieldData({}), Mock())
+    block.grader_endpoint = grader_endpoint
+    block.authentication_endpoint = auth_endpoint
+    block.user_identifier = "anonymous_student_id"
+    return block
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def print_latencies(name, values):
+    print(
+        "{:<10} {:>5} calls, {}".format(
+            name,
+            len(values),
+            ", ".join(
+                "p{} {:.3f}s".format(int(fraction * 100), percentile(values, fraction))
+                for fraction in (0.5, 0.9, 0.99)
+            ),
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("recording")
+    parser.add_argument(
+        "--threads",
+        type=int,
+        help="max concurrent calls plus the admission queue by default",
+    )
+    parser.add_argument("--calls", type=int, default=100)
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--max-concurrent", type=int, default=8)
+    parser.add_argument(
+        "--admission-queue", type=int, default=DEFAULT_ADMISSION_QUEUE_SIZE
+    )
+    parser.add_argument(
+        "--retry-after", type=int, default=1, help="seconds a busy call waits"
+    )
+    args = parser.parse_args()
+    threads = args.threads or args.max_concurrent + args.admission_queue
+    # shed calls are counted below, no need to log each of them
+    logging.getLogger("gradefetcher").setLevel(logging.ERROR)
+
+    auth_endpoint, grader_endpoint = endpoints(args.recording)
+    pools.set_transport(ReplayAdapter(args.recording, speed=args.speed, seed=0))
+    block = make_block(
+        auth_endpoint,
+        grader_endpoint,
+        {
+            "max_concurrent_requests": args.max_concurrent,
+            "admission_queue_size": args.admission_queue,
+            "retry_after": args.retry_after,
+        },
+    )
+
+    # latencies of completed calls by outcome ("success" or an error code),
+    # and of the rejected attempts
+    latencies = {}
+    rejections = []
+    lock = threading.Lock()
+    remaining = iter(range(args.calls))
+
+    def worker():
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            while True:
+                started = time.time()
+                response = block.grade_user(Mock(method="POST", body=b"{}"))
+                elapsed = time.time() - started
+                payload = json.loads(response.body.decode("utf-8"))
+                if payload.get("code") != "busy":
+                    break
+                with lock:
+                    rejections.append(elapsed)
+                time.sleep(payload["retry_after"])
+            outcome = payload.get("code") or payload["status"]
+            with lock:
+                latencies.setdefault(outcome, []).append(elapsed)
+
+    started = time.time()
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    wall = time.time() - started
+
+    completed = sum(len(values) for values in latencies.values())
+    print("threads    {}".format(threads))
+    print("throughput {:.1f}/s".format(completed / wall))
+    for outcome, values in sorted(latencies.items()):
+        print_latencies(outcome, values)
+    if rejections:
+        print_latencies("rejected", rejections)
+    print("limiter    {}".format(limiter_metrics()))
+
+
+if __name__ == "__main__":
+    main()
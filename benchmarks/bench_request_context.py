@@ -0,0 +1,109 @@
+"""
+Compare per-call service lookups and allocations of the grading hot path
+with and without a RequestContext.
+
+Run from the repository root:
+
+    DJANGO_SETTINGS_MODULE=test_settings PYTHONPATH=. python benchmarks/bench_request_context.py
+"""
+import timeit
+import tracemalloc
+
+import django
+from mock import Mock
+from xblock.field_data import DictFieldData
+
+django.setup()
+
+from gradefetcher.context import RequestContext  # noqa: E402
+from gradefetcher.gradefetcher import GradeFetcherXBlock  # noqa: E402
+
+RESULTS = 20
+ITERATIONS = 2000
+
+
+class CountingRuntime(object):
+    """A runtime stub that counts service lookups"""
+
+    anonymous_student_id = "anonymous"
+
+    def __init__(self):
+        self.lookups = 0
+        user = Mock(
+            emails=["test@example.com"],
+            opt_attrs={"edx-platform.user_id": 7, "edx-platform.username": "test"},
+        )
+        self.services = {
+            "i18n": Mock(gettext=lambda text: text),
+            "user": Mock(get_current_user=Mock(return_value=user)),
+            "settings": Mock(get_settings_bucket=Mock(return_value={"proxies": {}})),
+        }
+
+    def service(self, block, name):
+        self.lookups += 1
+        return self.services[name]
+
+    def get_user_role(self):
+        return "student"
+
+
+def grader_payload():
+    results = []
+    for index in range(RESULTS):
+        result = {"assignment_id": index, "reason": "reason {}".format(index)}
+        if index % 3:
+            result["grade"] = index % 2
+        results.append(result)
+    return {"results": results}
+
+
+def legacy_call(block, payload):
+    """The lookups grade_user used to do: one service lookup per gettext"""
+    block.get_settings()
+    block.user_data()[block.user_identifier]
+    for result in payload["results"]:
+        if result.get("grade", 0) == 0:
+            block.i18n_service.gettext(result["reason"])
+            block.i18n_service.gettext("Assignment {id}: <b>Failed</b> - {reason}")
+
+
+def context_call(block, payload):
+    context = RequestContext(block)
+    context.settings
+    context.user_identifier
+    for result in payload["results"]:
+        if result.get("grade", 0) == 0:
+            context.gettext(result["reason"])
+            context.gettext("Assignment {id}: <b>Failed</b> - {reason}")
+
+
+def measure(name, func):
+    runtime = CountingRuntime()
+    block = GradeFetcherXBlock(runtime, DictFieldData({}), Mock())
+    payload = grader_payload()
+
+    func(block, payload)
+    runtime.lookups = 0
+    func(block, payload)
+    lookups = runtime.lookups
+
+    tracemalloc.start()
+    func(block, payload)
+    allocated = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    seconds = timeit.timeit(lambda: func(block, payload), number=ITERATIONS)
+    print(
+        "{name:<10} {lookups:>8} {allocated:>12} {usec:>10.1f}".format(
+            name=name,
+            lookups=lookups,
+            allocated=allocated,
+            usec=seconds / ITERATIONS * 1e6,
+        )
+    )
+
+
+if __name__ == "__main__":
+    print("{:<10} {:>8} {:>12} {:>10}".format("", "lookups", "peak bytes", "usec/call"))
+    measure("legacy", legacy_call)
+    measure("context", context_call)
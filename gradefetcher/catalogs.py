@@ -0,0 +1,122 @@
+"""
+Translation catalogs for the grading hot path.
+
+Every ``translations/<locale>/LC_MESSAGES/text.po`` is compiled to a
+``text.mo`` next to it with ``msgfmt``. At runtime each ``.mo`` is parsed once
+per process and kept as a plain dict, so translating a string is a single dict
+lookup.
+
+``make check_catalogs`` fails when a ``.mo`` is missing or out of date.
+"""
+
+import gettext
+import io
+import os
+import threading
+
+from django.utils.translation import get_language, to_locale
+
+TRANSLATIONS_DIR = os.path.join(os.path.dirname(__file__), "translations")
+DOMAIN = "text"
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def available_locales():
+    """Locales which have a ``text.po`` source, sorted"""
+    return sorted(
+        locale
+        for locale in os.listdir(TRANSLATIONS_DIR)
+        if os.path.isfile(po_path(locale))
+    )
+
+
+def po_path(locale):
+    return os.path.join(TRANSLATIONS_DIR, locale, "LC_MESSAGES", DOMAIN + ".po")
+
+
+def mo_path(locale):
+    return os.path.join(TRANSLATIONS_DIR, locale, "LC_MESSAGES", DOMAIN + ".mo")
+
+
+def read_mo(mo_file):
+    """Parse a ``.mo`` file, a path or a binary file, into a msgid -> msgstr dict"""
+    if isinstance(mo_file, str):
+        with open(mo_file, "rb") as opened:
+            return read_mo(opened)
+    translation = gettext.GNUTranslations(mo_file)
+    return translation._catalog  # pylint: disable=protected-access
+
+
+def check_catalogs():
+    """
+    Find catalogs whose ``text.mo`` is missing or doesn't match its ``text.po``.
+
+    The ``.po`` is compiled in memory with polib, which follows ``msgfmt``'s
+    rules, and the messages are compared, leaving the headers out.
+
+    Returns:
+        list: (locale, problem) tuples, empty when everything is compiled
+    """
+    import polib  # pylint: disable=import-outside-toplevel
+
+    problems = []
+    for locale in available_locales():
+        if not os.path.isfile(mo_path(locale)):
+            problems.append((locale, "missing"))
+            continue
+        expected = read_mo(io.BytesIO(polib.pofile(po_path(locale)).to_binary()))
+        expected.pop("", None)
+        compiled = dict(read_mo(mo_path(locale)))
+        compiled.pop("", None)
+        if compiled != expected:
+            problems.append((locale, "stale"))
+    return problems
+
+
+def get_catalog(locale):
+    """
+    Get the msgid -> msgstr dict of ``locale``, loading it on first use.
+
+    ``fr_CA`` falls back to ``fr`` when there's no ``fr_CA`` catalog. Unknown
+    locales get an empty catalog.
+    """
+    catalog = _catalogs.get(locale)
+    if catalog is None:
+        with _catalogs_lock:
+            catalog = _catalogs.get(locale)
+            if catalog is None:
+                catalog = _load_catalog(locale)
+                _catalogs[locale] = catalog
+    return catalog
+
+
+def _load_catalog(locale):
+    for candidate in (locale, locale.split("_")[0]):
+        if os.path.isfile(mo_path(candidate)):
+            catalog = dict(read_mo(mo_path(candidate)))
+            catalog.pop("", None)
+            return catalog
+    return {}
+
+
+def get_active_catalog():
+    """The catalog of Django's active language"""
+    return get_catalog(to_locale(get_language() or "en"))
+
+
+def load_catalogs():
+    """Load every compiled catalog, e.g. when a worker starts"""
+    for locale in available_locales():
+        get_catalog(locale)
+
+
+def main(argv):
+    if argv[1:] == ["check"]:
+        problems = check_catalogs()
+        for locale, problem in problems:
+            print("{}: {} is {}".format(locale, mo_path(locale), problem))
+        return 1 if problems else 0
+    print("usage: {} check".format(argv[0]))
+    return 2
@@ -0,0 +1,189 @@
+"""
+Grader credential and proxy resolution.
+
+Values are looked up by layer, the first non-empty one wins:
+
+1. the ``GRADE_FETCHER`` site configuration of the current site
+2. the ``GradeFetcherXBlock`` XBlock settings bucket
+3. the block's own Studio fields
+
+The first two layers only change with deployment or site configuration, so
+they are merged once per site and cached until ``invalidate_grader_config``
+is called. Sites are told apart by the domain of the current request's site;
+without a current site the layers are only cached when no site configuration
+applies, so tenants never see each other's credentials. Code running outside
+of a request, like management commands, passes the course's ``org`` instead.
+"""
+
+import threading
+from collections import namedtuple
+
+from django.contrib.sites.shortcuts import get_current_site
+
+try:
+    from crum import get_current_request
+except ImportError:  # pragma: no cover - outside of Open edX (e.g. workbench)
+    get_current_request = None
+
+try:
+    from openedx.core.djangoapps.site_configuration import (
+        helpers as configuration_helpers,
+    )
+except ImportError:  # pragma: no cover - outside of Open edX (e.g. workbench)
+    configuration_helpers = None
+
+SITE_CONFIGURATION_KEY = "GRADE_FETCHER"
+
+# site configuration key -> GraderConfig field
+SITE_CONFIGURATION_FIELDS = {
+    "AUTHENTICATION_ENDPOINT": "authentication_endpoint",
+    "CLIENT_ID": "client_id",
+    "CLIENT_SECRET": "client_secret",
+    "USERNAME": "authentication_username",
+    "PASSWORD": "authentication_password",
+    "API_KEY": "api_key",
+    "PROXIES": "proxies",
+}
+
+# GraderConfig fields which can also be set on the block in Studio
+BLOCK_FIELDS = (
+    "authentication_endpoint",
+    "client_id",
+    "client_secret",
+    "authentication_username",
+    "authentication_password",
+    "api_key",
+)
+
+GraderConfig = namedtuple("GraderConfig", BLOCK_FIELDS + ("proxies",))
+GraderConfig.__doc__ = """
+Resolved grader credentials and proxies.
+
+It is hashable (``proxies`` is stored as sorted ``(scheme, url)`` pairs), so
+it can be used as a key for shared sessions and tokens.
+"""
+
+_site_layers = {}
+_site_layers_lock = threading.Lock()
+
+
+def freeze_proxies(proxies):
+    """Turn a requests ``proxies`` dict into a hashable value"""
+    return tuple(sorted((proxies or {}).items()))
+
+
+def current_site_key():
+    """
+    The domain of the current request's site, used to cache the site layers.
+
+    Returns:
+        str or None: None when there's no current request
+    """
+    request = get_current_request() if get_current_request is not None else None
+    if request is None:
+        return None
+    site = getattr(request, "site", None) or get_current_site(request)
+    return site.domain
+
+
+def org_site_key(org):
+    """The cache key of the site layers of the site serving ``org``"""
+    return "org:{}".format(org)
+
+
+def get_site_configuration(org=None):
+    """
+    The ``GRADE_FETCHER`` configuration of the current site, or of the site
+    serving ``org`` when given.
+    """
+    if configuration_helpers is None:
+        return {}
+    if org is not None:
+        value = configuration_helpers.get_value_for_org(org, SITE_CONFIGURATION_KEY, {})
+    else:
+        value = configuration_helpers.get_value(SITE_CONFIGURATION_KEY, {})
+    return value or {}
+
+
+def _build_site_layer(settings_bucket, site_configuration):
+    """Merge the site configuration over the XBlock settings"""
+    layer = {}
+    for field in GraderConfig._fields:
+        if settings_bucket.get(field):
+            layer[field] = settings_bucket[field]
+    for key, field in SITE_CONFIGURATION_FIELDS.items():
+        if site_configuration.get(key):
+            layer[field] = site_configuration[key]
+    layer["proxies"] = freeze_proxies(layer.get("proxies"))
+    return layer
+
+
+def get_site_layer(get_settings_bucket, site=None, org=None):
+    """
+    Get the cached site-level layers for ``site`` (the current site by default).
+
+    Args:
+        get_settings_bucket (callable): returns the XBlock settings bucket,
+            only called when the site isn't cached yet
+        org (str): use the site configuration of the site serving this
+            course org rather than the current site's
+
+    Returns:
+        dict: GraderConfig field values set at site or XBlock settings level
+    """
+    if org is not None:
+        site = org_site_key(org)
+    elif site is None:
+        site = current_site_key()
+    if site is None:
+        # Without a current site a cached layer could be served to any
+        # tenant, so only the site-independent layer is cached
+        site_configuration = get_site_configuration()
+        if site_configuration:
+            return _build_site_layer(get_settings_bucket() or {}, site_configuration)
+        site = ""
+    layer = _site_layers.get(site)
+    if layer is None:
+        with _site_layers_lock:
+            layer = _site_layers.get(site)
+            if layer is None:
+                layer = _build_site_layer(
+                    get_settings_bucket() or {}, get_site_configuration(org)
+                )
+                _site_layers[site] = layer
+    return layer
+
+
+def resolve_grader_config(block, get_settings_bucket, site=None, org=None):
+    """
+    Resolve the GraderConfig for ``block``.
+
+    Args:
+        block (GradeFetcherXBlock): supplies the Studio field fallbacks
+        get_settings_bucket (callable): returns the XBlock settings bucket
+        org (str): resolve for the site serving this course org, e.g. when
+            there's no current request
+
+    Returns:
+        GraderConfig
+    """
+    layer = get_site_layer(get_settings_bucket, site, org)
+    return GraderConfig(
+        *[layer.get(field) or getattr(block, field) for field in BLOCK_FIELDS],
+        proxies=layer["proxies"]
+    )
+
+
+def invalidate_grader_config(site=None):
+    """
+    Forget the cached site layers of ``site`` (a site domain or an
+    ``org_site_key``), or of all sites when omitted.
+
+    Call it after changing a site's ``GRADE_FETCHER`` configuration or the
+    XBlock settings.
+    """
+    with _site_layers_lock:
+        if site is None:
+            _site_layers.clear()
+        else:
+            _site_layers.pop(site, None)
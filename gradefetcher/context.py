@@ -0,0 +1,90 @@
+"""Per-request state for GradeFetcherXBlock handlers."""
+
+from .catalogs import get_active_catalog
+from .config import resolve_grader_config
+
+_UNSET = object()
+
+# How to compute each supported ``user_identifier`` from a RequestContext.
+# Only the configured one is evaluated, so e.g. ``anonymous_student_id``
+# never touches the user service.
+USER_IDENTIFIERS = {
+    "email": lambda context: context.user.emails[0],
+    "username": lambda context: context.user.opt_attrs["edx-platform.username"],
+    "user_id": lambda context: context.user.opt_attrs["edx-platform.user_id"],
+    "anonymous_student_id": lambda context: context.runtime.anonymous_student_id,
+    "role": lambda context: context.runtime.get_user_role(),
+}
+
+
+class RequestContext(object):
+    """
+    Resolves runtime services and user data at most once per handler call.
+
+    A context is meant to be created at the start of a handler and thrown
+    away at the end of it, so nothing cached here outlives the request.
+    """
+
+    def __init__(self, block):
+        self.block = block
+        self.runtime = block.runtime
+        self._i18n_service = _UNSET
+        self._catalog = _UNSET
+        self._settings = _UNSET
+        self._grader_config = _UNSET
+        self._user = _UNSET
+        self._user_identifier = _UNSET
+
+    @property
+    def i18n_service(self):
+        """The i18n service, resolved on first use"""
+        if self._i18n_service is _UNSET:
+            self._i18n_service = self.runtime.service(self.block, "i18n")
+        return self._i18n_service
+
+    @property
+    def catalog(self):
+        """The compiled catalog of the active language, resolved on first use"""
+        if self._catalog is _UNSET:
+            self._catalog = get_active_catalog()
+        return self._catalog
+
+    def gettext(self, text):
+        """
+        Translate ``text`` with the block's own catalog, falling back to the
+        i18n service for strings it doesn't have.
+        """
+        translated = self.catalog.get(text)
+        if translated is None:
+            return self.i18n_service.gettext(text)
+        return translated
+
+    @property
+    def settings(self):
+        """The XBlock settings bucket, resolved on first use"""
+        if self._settings is _UNSET:
+            self._settings = self.block.get_settings()
+        return self._settings
+
+    @property
+    def grader_config(self):
+        """The GraderConfig for the block on the current site"""
+        if self._grader_config is _UNSET:
+            self._grader_config = resolve_grader_config(
+                self.block, lambda: self.settings
+            )
+        return self._grader_config
+
+    @property
+    def user(self):
+        """The current user from the user service, resolved on first use"""
+        if self._user is _UNSET:
+            self._user = self.runtime.service(self.block, "user").get_current_user()
+        return self._user
+
+    @property
+    def user_identifier(self):
+        """The value of the block's configured ``user_identifier``"""
+        if self._user_identifier is _UNSET:
+            self._user_identifier = USER_IDENTIFIERS[self.block.user_identifier](self)
+        return self._user_identifier
@@ -0,0 +1,391 @@
+"""
+The grade fetching pipeline, independent of the XBlock runtime.
+
+A GradeEngine turns a GraderConfig, a GraderEndpoint and a user identifier
+into a GradeResult: it authenticates, calls the grader, parses its answer and
+computes the grade. It needs no runtime, i18n or user service, so the same
+code serves ``GradeFetcherXBlock.grade_user``, bulk exports and batch jobs on
+thread or process pools::
+
+    engine = GradeEngine(config, endpoint, language="fr")
+    for result in engine.grade_many(emails, workers=8):
+        ...
+"""
+
+import collections
+import concurrent.futures
+import logging
+import urllib.parse
+from collections import namedtuple
+from operator import truediv
+
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator
+from django.utils.translation import gettext_noop
+
+from .catalogs import get_catalog
+from .pools import forget_token, get_session, get_token
+
+LOGGER = logging.getLogger(__name__)
+
+AUTHENTICATION_TIMEOUT = 10
+GRADER_TIMEOUT = 25
+
+GraderEndpoint = namedtuple(
+    "GraderEndpoint",
+    [
+        "grader_endpoint",
+        "http_method",
+        "user_identifier_parameter",
+        "activity_identifier_parameter",
+        "activity_identifier",
+        "extra_params",
+    ],
+)
+GraderEndpoint.__doc__ = "How to ask the grader for a user's results"
+
+GradeResult = namedtuple(
+    "GradeResult",
+    ["user_identifier", "status", "grade", "results", "code", "message"],
+)
+GradeResult.__doc__ = """
+The outcome of grading one user.
+
+``status`` is ``success`` or ``error``. On success ``grade`` is the grade in
+percent and ``results`` the structured per-assignment results; on error
+``code`` is a stable key and ``message`` the translated message.
+"""
+
+# Messages are marked for extraction here and translated when a result is
+# built, with the engine's gettext
+ACCOUNT_NOT_FOUND_MESSAGE = gettext_noop(
+    """
+                    We cannot find your account. Please make sure
+                    that you have created your account. If you need
+                    assistance, please contact the course team.
+                    """
+)
+UNEXPECTED_ERROR_MESSAGE = gettext_noop(
+    """
+                Something went wrong, please contact the course team.
+                """
+)
+BUSY_MESSAGE = gettext_noop("The grader is busy, please try again in a few seconds.")
+
+_validate_url = URLValidator()
+
+
+def grade_from_list(grades):
+    """take a list of integers and calculate grade from them"""
+    if len(grades) > 1:
+        total_grade = sum(grades)
+        grade = int(truediv(total_grade * 100, len(grades)))
+    elif len(grades) == 1:
+        grade = grades[0] * 100
+    else:
+        grade = 0
+    return grade
+
+
+def is_valid_url(url):
+    """
+    Helper function used to check if a string is a valid url.
+
+    Args:
+        url (str): the url string to be validated
+
+    Returns:
+        bool: whether the url is valid or not
+    """
+    try:
+        _validate_url(url)
+        return True
+    except ValidationError:
+        return False
+
+
+def endpoint_from_block(block):
+    """The GraderEndpoint configured on a GradeFetcherXBlock"""
+    return GraderEndpoint(*[getattr(block, field) for field in GraderEndpoint._fields])
+
+
+def error_result(user_identifier, code, message):
+    """A GradeResult for a failure"""
+    return GradeResult(user_identifier, "error", None, None, code, message)
+
+
+def grader_failure(status_code, payload, gettext):
+    """
+    Check a grader answer for an error.
+
+    Returns:
+        tuple: (code, message) of the error, or None if the answer has results
+    """
+    if "results" in payload:
+        return None
+    if status_code == 500:
+        return "grader_error", gettext(payload["errorMessage"])
+    return "account_not_found", gettext(ACCOUNT_NOT_FOUND_MESSAGE)
+
+
+def parse_results(payload, gettext):
+    """
+    Turn the grader's results into a grade and a list of structured results.
+
+    Each result carries the ``assignment_id``, an ``outcome`` (one of
+    ``passed``, ``failed`` or ``info``) which is the key of the message
+    template the client renders it with, and the translated ``reason``
+    for anything but a pass.
+    """
+    grades = []
+    results = []
+    for result in payload["results"]:
+        item = {"assignment_id": result.get("assignment_id", "")}
+        if "grade" in result:
+            grades.append(result["grade"])
+            if result["grade"] > 0:
+                item["outcome"] = "passed"
+            elif result["grade"] == 0:
+                item["outcome"] = "failed"
+                item["reason"] = gettext(result["reason"])
+            else:
+                continue
+        else:
+            item["outcome"] = "info"
+            item["reason"] = gettext(result["reason"])
+        results.append(item)
+    return grade_from_list(grades), results
+
+
+class GradeEngine(object):
+    """
+    Grades users against one grader configuration.
+
+    Args:
+        config (GraderConfig): credentials and proxies
+        endpoint (GraderEndpoint): where and how to call the grader
+        gettext (callable): translates messages; defaults to the compiled
+            catalog of ``language``
+        language (str): a locale such as ``fr_CA``, used when no ``gettext``
+            is given
+        limiter (HostLimiter): optional, bounds concurrent grader calls
+        get_settings_bucket (callable): optional, returns the XBlock settings
+            bucket, for the transport configured there
+
+    Engines can be shared between threads. When sent to a process pool only
+    ``language`` is kept for translations, and the limiter and settings are
+    dropped.
+    """
+
+    def __init__(
+        self,
+        config,
+        endpoint,
+        gettext=None,
+        language="en",
+        limiter=None,
+        get_settings_bucket=None,
+    ):
+        self.config = config
+        self.endpoint = endpoint
+        self.language = language
+        self.gettext = gettext or get_catalog(language).get
+        self.limiter = limiter
+        self.get_settings_bucket = get_settings_bucket
+        self.validation_error = self._validate()
+        self.base_query = self._base_query()
+
+    def __getstate__(self):
+        return dict(self.__dict__, gettext=None, limiter=None, get_settings_bucket=None)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.gettext = get_catalog(self.language).get
+
+    def translate(self, text):
+        translated = self.gettext(text)
+        return text if translated is None else translated
+
+    def _validate(self):
+        """The (code, message) of a configuration error, or None"""
+        if not is_valid_url(self.endpoint.grader_endpoint):
+            LOGGER.warning(
+                "Grader endpoint is not a valid url: %s",
+                self.endpoint.grader_endpoint,
+            )
+            return (
+                "invalid_grader_endpoint",
+                gettext_noop("Grader endpoint is not a valid url"),
+            )
+        if self.config.authentication_endpoint and not is_valid_url(
+            self.config.authentication_endpoint
+        ):
+            LOGGER.warning(
+                "Authentication endpoint is not a valid url: %s",
+                self.config.authentication_endpoint,
+            )
+            return (
+                "invalid_authentication_endpoint",
+                gettext_noop("Authentication endpoint is not a valid url"),
+            )
+        if self.endpoint.http_method != "get":
+            LOGGER.warning(
+                "Unsupported HTTP method for the grader: %s",
+                self.endpoint.http_method,
+            )
+            return "unexpected_error", UNEXPECTED_ERROR_MESSAGE
+        return None
+
+    def check(self, user_identifier=None):
+        """
+        The error GradeResult of an invalid configuration, or None.
+
+        Lets callers report configuration errors without looking a user up.
+        """
+        if self.validation_error is None:
+            return None
+        code, message = self.validation_error
+        return error_result(user_identifier, code, self.translate(message))
+
+    def _base_query(self):
+        """The part of the grader query which is the same for every user"""
+        query = {}
+        if self.endpoint.activity_identifier_parameter and (
+            self.endpoint.activity_identifier
+        ):
+            query[self.endpoint.activity_identifier_parameter] = (
+                self.endpoint.activity_identifier
+            )
+        if self.endpoint.extra_params:
+            query.update(urllib.parse.parse_qs(self.endpoint.extra_params))
+        return query
+
+    def request(self, user_identifier):
+        """
+        Call the grader endpoint for a user, authenticating first if needed.
+
+        Returns:
+            requests.Response: the grader's response
+        """
+        config = self.config
+        session = get_session(config, self.get_settings_bucket)
+        grader_headers = {"Content-Type": "application/json"}
+        # 1. If user in studio set authentication endpoint we call it
+        if config.authentication_endpoint:
+            # 2. Make call to auth endpoint and get the token
+            token = get_token(config, session, timeout=AUTHENTICATION_TIMEOUT)
+            # add the token to the headers
+            grader_headers["Authorization"] = "Bearer {token}".format(token=token)
+            # add api key in the headers if it's set in studio
+            if config.api_key:
+                grader_headers["x-api-key"] = config.api_key
+        # 3. Make a call to the grader endpoint
+        query = dict(self.base_query)
+        query[self.endpoint.user_identifier_parameter] = user_identifier
+        grader_response = session.get(
+            self.endpoint.grader_endpoint,
+            params=query,
+            headers=grader_headers,
+            timeout=GRADER_TIMEOUT,
+        )
+        if grader_response.status_code == 401:
+            forget_token(config)
+        return grader_response
+
+    def grade(self, user_identifier):
+        """
+        Grade one user. Never raises, failures are error results.
+
+        Args:
+            user_identifier: the value sent as ``user_identifier_parameter``
+
+        Returns:
+            GradeResult
+        """
+        invalid = self.check(user_identifier)
+        if invalid:
+            return invalid
+        try:
+            if self.limiter is not None:
+                admitted = self.limiter.acquire()
+                self.limiter.report(admitted)
+                if not admitted:
+                    LOGGER.warning(
+                        "Too many concurrent calls to %s, shedding load",
+                        self.limiter.host,
+                    )
+                    return error_result(
+                        user_identifier, "busy", self.translate(BUSY_MESSAGE)
+                    )
+                try:
+                    grader_response = self.request(user_identifier)
+                finally:
+                    self.limiter.release()
+            else:
+                grader_response = self.request(user_identifier)
+            payload = grader_response.json()
+            failure = grader_failure(
+                grader_response.status_code, payload, self.translate
+            )
+            if failure:
+                return error_result(user_identifier, *failure)
+            grade, results = parse_results(payload, self.translate)
+        except Exception as e:  # pylint: disable=broad-except
+            LOGGER.exception(e)
+            return error_result(
+                user_identifier,
+                "unexpected_error",
+                self.translate(UNEXPECTED_ERROR_MESSAGE),
+            )
+        return GradeResult(user_identifier, "success", grade, results, None, None)
+
+    def grade_many(self, user_identifiers, workers=1, executor=None, window=None):
+        """
+        Grade users lazily, optionally concurrently.
+
+        Args:
+            user_identifiers (iterable): the users to grade, consumed lazily
+            workers (int): size of the thread pool to use when no
+                ``executor`` is given; 1 grades in the calling thread. Keep
+                it within the limiter's capacity, calls over it come back
+                as ``busy`` errors
+            executor (concurrent.futures.Executor): optional, e.g. a
+                ProcessPoolExecutor
+            window (int): the most users in flight at once, ``2 * workers``
+                by default, which keeps memory constant for any number of users
+
+        Yields:
+            GradeResult: in the order of ``user_identifiers``
+        """
+        if executor is None and workers <= 1:
+            for user_identifier in user_identifiers:
+                yield self.grade(user_identifier)
+            return
+        window = window or 2 * max(workers, 1)
+        if executor is None:
+            with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+                for result in self._map(executor, user_identifiers, window):
+                    yield result
+        else:
+            for result in self._map(executor, user_identifiers, window):
+                yield result
+
+    def _map(self, executor, user_identifiers, window):
+        """Submit at most ``window`` users ahead of the results yielded"""
+        pending = collections.deque()
+        for user_identifier in user_identifiers:
+            pending.append(executor.submit(self.grade, user_identifier))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def grade_users(config, endpoint, user_identifiers, workers=1, **kwargs):
+    """
+    Grade ``user_identifiers`` against one grader.
+
+    A shortcut for ``GradeEngine(config, endpoint, **kwargs).grade_many``.
+    """
+    engine = GradeEngine(config, endpoint, **kwargs)
+    return engine.grade_many(user_identifiers, workers=workers)
@@ -0,0 +1,267 @@
+"""
+Export of fetched grades for a course.
+
+Everything here is a generator: learners' state is read lazily from the
+database and written out in chunks, so exporting a large course takes
+constant memory.
+"""
+
+import collections
+import csv
+import io
+import itertools
+import json
+import logging
+
+from .config import resolve_grader_config
+from .engine import GradeEngine, endpoint_from_block, error_result
+
+LOGGER = logging.getLogger(__name__)
+
+BLOCK_TYPE = "gradefetcher"
+EXPORT_FIELDS = (
+    "course_id",
+    "block_id",
+    "user_id",
+    "username",
+    "recorded_grade",
+    "stored_grade",
+    "results",
+    "fetched_grade",
+    "fetch_error",
+)
+CHUNK_SIZE = 500
+
+
+def iter_student_modules(course_key, chunk_size=CHUNK_SIZE, by_block=False):
+    """
+    Iterate over the stored state of every gradefetcher block in a course.
+
+    Only available inside the LMS.
+
+    Args:
+        by_block (bool): order the records by block first, so the learners
+            of a block come one after the other
+    """
+    from lms.djangoapps.courseware.models import (  # pylint: disable=import-error
+        StudentModule,
+    )
+
+    ordering = ("module_state_key", "id") if by_block else ("id",)
+    return (
+        StudentModule.objects.filter(course_id=course_key, module_type=BLOCK_TYPE)
+        .select_related("student")
+        .order_by(*ordering)
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def export_rows(modules, fetcher=None, workers=1):
+    """
+    Turn StudentModule records into export rows.
+
+    Args:
+        modules (iterable): StudentModule-like records
+        fetcher (FreshGradeFetcher): optional, fetches each learner's
+            current grade
+        workers (int): how many grades the fetcher fetches at once
+
+    Yields:
+        dict: one row per learner and block, keyed by EXPORT_FIELDS
+    """
+    if fetcher is None:
+        fetched = ((module, None) for module in modules)
+    else:
+        fetched = fetcher.fetch_many(modules, workers=workers)
+    for module, result in fetched:
+        state = json.loads(module.state or "{}")
+        recorded_grade = None
+        if module.grade is not None and module.max_grade:
+            recorded_grade = int(module.grade * 100 / module.max_grade)
+        row = {
+            "course_id": str(module.course_id),
+            "block_id": str(module.module_state_key),
+            "user_id": module.student.id,
+            "username": module.student.username,
+            "recorded_grade": recorded_grade,
+            "stored_grade": state.get("grade"),
+            "results": state.get("results", []),
+            "fetched_grade": None,
+            "fetch_error": None,
+        }
+        if result is not None:
+            row["fetched_grade"] = result.grade
+            row["fetch_error"] = result.code
+            if result.status == "error":
+                LOGGER.warning(
+                    "Could not fetch grade of user %s for %s: %s",
+                    row["user_id"],
+                    row["block_id"],
+                    result.code,
+                )
+        yield row
+
+
+def csv_chunks(rows, chunk_size=CHUNK_SIZE):
+    """
+    Write ``rows`` as CSV, yielding the output every ``chunk_size`` rows.
+
+    ``results`` is written as a JSON string.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    for count, row in enumerate(rows, 1):
+        row = dict(row, results=json.dumps(row["results"]))
+        writer.writerow(row)
+        if count % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+    yield buffer.getvalue()
+
+
+def jsonl_chunks(rows, chunk_size=CHUNK_SIZE):
+    """
+    Write ``rows`` as JSON lines, yielding the output every ``chunk_size`` rows.
+    """
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(row) + "\n")
+        if len(lines) == chunk_size:
+            yield "".join(lines)
+            lines = []
+    yield "".join(lines)
+
+
+WRITERS = {
+    "csv": csv_chunks,
+    "jsonl": jsonl_chunks,
+}
+
+
+def user_identifier_for(block, user, course_key):
+    """The value of the block's ``user_identifier`` for a Django user"""
+    if block.user_identifier == "email":
+        return user.email
+    if block.user_identifier == "username":
+        return user.username
+    if block.user_identifier == "user_id":
+        return user.id
+    if block.user_identifier == "anonymous_student_id":
+        from common.djangoapps.student.models import (  # pylint: disable=import-error
+            anonymous_id_for_user,
+        )
+
+        return anonymous_id_for_user(user, course_key)
+    raise ValueError("Unsupported user identifier: {}".format(block.user_identifier))
+
+
+class FreshGradeFetcher(object):
+    """
+    Fetches a learner's current grade from the external grader.
+
+    Blocks are loaded from the modulestore once per block and a GradeEngine
+    built for each, so the per-learner cost is the grader call itself. Like
+    the engine, it never raises: failures are error GradeResults.
+    """
+
+    def __init__(self, course_key, get_block=None):
+        self.course_key = course_key
+        if get_block is None:
+            from xmodule.modulestore.django import (  # pylint: disable=import-error
+                modulestore,
+            )
+
+            get_block = modulestore().get_item
+        self.get_block = get_block
+        self._blocks = {}
+
+    def block(self, usage_key):
+        if usage_key not in self._blocks:
+            block = self.get_block(usage_key)
+            engine = GradeEngine(
+                # no current site here, use the one serving the course
+                resolve_grader_config(
+                    block, block.get_settings, org=self.course_key.org
+                ),
+                endpoint_from_block(block),
+                get_settings_bucket=block.get_settings,
+            )
+            self._blocks[usage_key] = (block, engine)
+        return self._blocks[usage_key]
+
+    def __call__(self, module):
+        """The GradeResult of the learner of a StudentModule record"""
+        return next(self.fetch_many([module]))[1]
+
+    def fetch_many(self, modules, workers=1):
+        """
+        Fetch the grades of many StudentModule records.
+
+        Consecutive records of the same block are graded together with
+        ``GradeEngine.grade_many``, ``workers`` at a time, so records should
+        come ordered by block (see ``iter_student_modules``).
+
+        Yields:
+            tuple: (module, GradeResult), in the order of ``modules``
+        """
+        for usage_key, group in itertools.groupby(
+            modules, key=lambda module: module.module_state_key
+        ):
+            try:
+                block, engine = self.block(usage_key)
+            except Exception as e:  # pylint: disable=broad-except
+                LOGGER.exception(e)
+                for module in group:
+                    yield module, error_result(None, "unexpected_error", str(e))
+                continue
+            # the records of the users handed to grade_many, with the error
+            # of those whose identifier couldn't be computed
+            pending = collections.deque()
+            identifiers = self._user_identifiers(block, group, pending)
+            for result in engine.grade_many(identifiers, workers=workers):
+                while pending[0][1] is not None:
+                    yield self._failed(*pending.popleft())
+                yield pending.popleft()[0], result
+            while pending:
+                yield self._failed(*pending.popleft())
+
+    def _user_identifiers(self, block, modules, pending):
+        for module in modules:
+            try:
+                identifier = user_identifier_for(block, module.student, self.course_key)
+            except Exception as e:  # pylint: disable=broad-except
+                pending.append((module, e))
+                continue
+            pending.append((module, None))
+            yield identifier
+
+    @staticmethod
+    def _failed(module, error):
+        LOGGER.warning("Could not compute the user identifier: %s", error)
+        return module, error_result(None, "unexpected_error", str(error))
+
+
+def export_course_grades(
+    course_key, output_format="csv", fetch=False, chunk_size=CHUNK_SIZE, workers=1
+):
+    """
+    Export the fetched grades of a course.
+
+    Args:
+        course_key (CourseKey): the course to export
+        output_format (str): ``csv`` or ``jsonl``
+        fetch (bool): also fetch each learner's current grade from the grader,
+            in which case rows are ordered by block
+        workers (int): how many grader calls to make at once when fetching
+
+    Returns:
+        iterator: str chunks of the export
+    """
+    rows = export_rows(
+        iter_student_modules(course_key, chunk_size, by_block=fetch),
+        FreshGradeFetcher(course_key) if fetch else None,
+        workers=workers,
+    )
+    return WRITERS[output_format](rows, chunk_size)
@@ -1,36 +1,40 @@
+import json
 import logging
 import os
 import urllib.parse
-from operator import truediv
 
 import pkg_resources
-import requests
-from django.core.exceptions import ValidationError
-from django.core.validators import URLValidator
 from django.template import Context
 from django.utils.translation import ugettext_lazy as _
 from markupsafe import Markup
 from web_fragments.fragment import Fragment
+from webob import Response
 from xblock.core import XBlock
-from xblock.fields import Integer, Scope, String
+from xblock.fields import Integer, List, Scope, String
 from xblockutils.resources import ResourceLoader
 from xblockutils.studio_editable import StudioEditableXBlockMixin
 
+from .catalogs import load_catalogs
+from .context import RequestContext
+from .engine import (  # noqa: F401 grade_from_list is imported from here
+    UNEXPECTED_ERROR_MESSAGE,
+    GradeEngine,
+    endpoint_from_block,
+    grade_from_list,
+    is_valid_url,
+)
+from .limits import get_limiter
+from .profiling import profiled
+
 LOGGER = logging.getLogger(__name__)
 
 loader = ResourceLoader(__name__)
 
+# Parse the compiled translation catalogs once per process
+load_catalogs()
 
-def grade_from_list(grades):
-    """take a list of integers and calculate grade from them"""
-    if len(grades) > 1:
-        total_grade = sum(grades)
-        grade = int(truediv(total_grade * 100, len(grades)))
-    elif len(grades) == 1:
-        grade = grades[0] * 100
-    else:
-        grade = 0
-    return grade
+# Bump whenever the shape of the ``grade_user`` response changes.
+RESPONSE_VERSION = 1
 
 
 @XBlock.needs("i18n", "user")
@@ -111,6 +115,12 @@ class GradeFetcherXBlock(XBlock, StudioEditableXBlockMixin):
         default=0,
         scope=Scope.user_state,
     )
+    results = List(
+        display_name=_("Assignment results"),
+        help=_("Per-assignment results of the last grade fetched for the user"),
+        scope=Scope.user_state,
+        default=[],
+    )
     reason = String(
         display_name=_(
             """
@@ -224,16 +234,14 @@ class GradeFetcherXBlock(XBlock, StudioEditableXBlockMixin):
         Returns:
             bool: whether the url is valid or not
         """
-        validate = URLValidator()
-        try:
-            validate(url)
-            return True
-        except ValidationError:
-            return False
+        return is_valid_url(url)
 
     def user_data(self):
         """
         This method initializes user's parameters
+
+        Handlers only need the configured ``user_identifier``; use
+        ``RequestContext.user_identifier`` there instead of building all of them.
         """
         runtime = self.runtime  # pylint: disable=no-member
         user = runtime.service(self, "user").get_current_user()
@@ -245,66 +253,61 @@ class GradeFetcherXBlock(XBlock, StudioEditableXBlockMixin):
         user_data["anonymous_student_id"] = runtime.anonymous_student_id
         return user_data
 
-    def grader_response_failed(self, grader_response):
-        if "results" not in grader_response.json():
-            if grader_response.status_code == 500:
-                msg = grader_response.json()["errorMessage"]
-                msg = self.i18n_service.gettext(msg)
-            else:
-                msg = self.i18n_service.gettext(
-                    """
-                    We cannot find your account. Please make sure
-                    that you have created your account. If you need
-                    assistance, please contact the course team.
-                    """
-                )
-            htmlFormat = Markup("<span>{message}</span>")
-            return {
-                "status": "error",
-                "msg": msg,
-                "grade": "",
-                "reason": "",
-                "results": "",
-                "htmlFormat": htmlFormat.format(message=msg),
-            }
-        else:
-            return False
-
-    def process_grader_response(self, grader_response):
-        grades = []
-        for result in grader_response.json()["results"]:
-            if "grade" in result:
-                grades.append(result["grade"])
-        grade = grade_from_list(grades)
-        reasons = []
-        for result in grader_response.json()["results"]:
-            if "grade" in result:
-                if result["grade"] > 0:
-                    reason = self.i18n_service.gettext(
-                        "Assignment {assignment_id}: <b>Passed</b>"
-                    ).format(
-                        assignment_id=result.get("assignment_id", ""),
-                    )
-                    reasons.append(reason)
-                elif result["grade"] == 0:
-                    reason_api_text = self.i18n_service.gettext(result["reason"])
-                    reason = self.i18n_service.gettext(
-                        "Assignment {id}: <b>Failed</b> - {reason}"
-                    ).format(
-                        id=result["assignment_id"],
-                        reason=reason_api_text,
-                    )
-                    reasons.append(reason)
-            elif "grade" not in result:
-                reason_api_text = self.i18n_service.gettext(result["reason"])
-                reason = self.i18n_service.gettext(
-                    "Assignment {assignment_id}: {reason_api_text}"
-                ).format(
-                    assignment_id=result.get("assignment_id", ""),
-                    reason_api_text=reason_api_text,
-                )
-                reasons.append(reason)
-        return grade, reasons
+    def error_response(self, code, msg):
+        """
+        Build the compact error payload returned by ``grade_user``.
+
+        Args:
+            code (str): a stable key the client can use to identify the error
+            msg (str): the translated message to show to the user
+
+        Returns:
+            dict: the error response
+        """
+        return {
+            "version": RESPONSE_VERSION,
+            "status": "error",
+            "code": code,
+            "msg": msg,
+        }
+
+    def busy_response(self, msg, retry_after):
+        """
+        Tell the client the grader is busy and when to try again.
+
+        Returns:
+            Response: a 503 with a ``Retry-After`` header and the error payload
+        """
+        payload = self.error_response("busy", msg)
+        payload["retry_after"] = retry_after
+        return Response(
+            json.dumps(payload),
+            status=503,
+            content_type="application/json",
+            charset="utf8",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    def result_messages(self):
+        """
+        Translated message templates the client uses to render results.
+
+        The keys match the ``outcome`` of each result in the ``grade_user``
+        response, plus ``summary`` for the overall grade and ``error`` for
+        failed requests.
+        """
+        gettext = RequestContext(self).gettext
+        return {
+            "summary": gettext(
+                "You got <span class='grade'>{grade}% </span> "
+                "score for this activity.<br />Explanation: <span class='reason'>"
+                "<ul>{reasons_msg}</ul></span>"
+            ),
+            "passed": gettext("Assignment {assignment_id}: <b>Passed</b>"),
+            "failed": gettext("Assignment {id}: <b>Failed</b> - {reason}"),
+            "info": gettext("Assignment {assignment_id}: {reason_api_text}"),
+            "error": gettext("Something went wrong please try again."),
+        }
 
     def get_settings(self):
         """
@@ -333,6 +336,7 @@ class GradeFetcherXBlock(XBlock, StudioEditableXBlockMixin):
             i18n_service=self.runtime.service(self, "i18n"),
         )
 
+    @profiled
     def student_view(self, context=None):
         """
         The primary view of the GradeFetcherXBlock, shown to students
@@ -343,7 +347,7 @@ class GradeFetcherXBlock(XBlock, StudioEditableXBlockMixin):
             "title": self.title,
             "button_text": self.button_text,
             "grade": self.grade,
-            "reason": self.reason,
+            "results": self.results,
             "authentication_endpoint": self.authentication_endpoint,
             "grader_endpoint": self.grader_endpoint,
             "extra_params": "&{}".format(Markup(self.extra_params)),
@@ -352,9 +356,22 @@ class GradeFetcherXBlock(XBlock, StudioEditableXBlockMixin):
         frag = Fragment(html)
         frag.add_css(self.load_resource("static/css/gradefetcher.css"))
         frag.add_javascript(self.load_resource("static/js/src/gradefetcher.js"))
-        frag.initialize_js("GradeFetcherXBlock")
+        init_args = {
+            "version": RESPONSE_VERSION,
+            "messages": self.result_messages(),
+            "result": None,
+        }
+        if self.results:
+            init_args["result"] = {
+                "version": RESPONSE_VERSION,
+                "status": "success",
+                "grade": self.grade,
+                "results": self.results,
+            }
+        frag.initialize_js("GradeFetcherXBlock", init_args)
         return frag
 
+    @profiled
     def studio_view(self, context=None):
         fragment = Fragment()
         context = {"fields": []}
@@ -383,128 +400,59 @@ class GradeFetcherXBlock(XBlock, StudioEditableXBlockMixin):
         if i18n_service:
             return i18n_service
 
+    def grade_engine(self, context):
+        """
+        The GradeEngine for this block's configuration, bounded by the
+        concurrency limiter of the grader's host.
+        """
+        return GradeEngine(
+            context.grader_config,
+            endpoint_from_block(self),
+            gettext=context.gettext,
+            limiter=get_limiter(
+                urllib.parse.urlsplit(self.grader_endpoint).hostname,
+                lambda: context.settings,
+            ),
+            get_settings_bucket=lambda: context.settings,
+        )
+
     @XBlock.json_handler
+    @profiled
     def grade_user(self, data, suffix=""):
         """
         Make a call to an external grader and retreive user's grade
         """
-
-        if not self.is_valid_url(self.grader_endpoint):
-            LOGGER.warning(
-                "Grader endpoint is not a valid url: %s",
-                self.grader_endpoint,
-            )
-            msg = self.i18n_service.gettext("Grader endpoint is not a valid url")
-            htmlFormat = Markup("<span>{message}</span>")
-            return {
-                "status": "error",
-                "msg": msg,
-                "grade": "",
-                "reason": "",
-                "results": "",
-                "htmlFormat": htmlFormat.format(message=msg),
-            }
-
-        # 1. If user in studio set authentication endpoint we call it
+        context = RequestContext(self)
         try:
-            # Get EXTERNAL_GRADER from configuration
-            proxies = self.get_settings()["proxies"]
-            grader_headers = {"Content-Type": "application/json"}
-            if self.authentication_endpoint:
-                # 2. Make call to auth endpoint and get the token
-                if self.is_valid_url(self.authentication_endpoint):
-                    # 2. Make call to auth endpoint and get the token
-                    auth_response = requests.post(
-                        self.authentication_endpoint,
-                        proxies=proxies,
-                        auth=(
-                            self.client_id,
-                            self.client_secret,
-                        ),
-                        headers={"Accept": "application/json"},
-                        data={
-                            "grant_type": "password",
-                            "username": self.authentication_username,
-                            "password": self.authentication_password,
-                        },
-                        timeout=10,
-                    )
-                    # get the token from the call
-                    token = auth_response.json()["access_token"]
-                    # add the token to the headers
-                    grader_headers["Authorization"] = "Bearer {token}".format(
-                        token=token
-                    )
-                    # add api key in the headers if it's set in studio
-                    if self.api_key:
-                        grader_headers["x-api-key"] = self.api_key
-                else:
-                    LOGGER.warning(
-                        "Authentication endpoint is not a valid url: %s",
-                        self.authentication_endpoint,
-                    )
-                    return {
-                        "status": "error",
-                        "message": self.i18n_service.ugettext(
-                            "Authentication endpoint is not a valid url"
-                        ),
-                    }
-            # 3. Make a call to the grader endpoint
-            if self.http_method == "get":
-                query = {
-                    self.user_identifier_parameter: self.user_data()[
-                        self.user_identifier
-                    ]
-                }
-                if self.activity_identifier_parameter and self.activity_identifier:
-                    query[self.activity_identifier_parameter] = self.activity_identifier
-                if self.extra_params:
-                    query.update(urllib.parse.parse_qs(self.extra_params))
-                grader_response = requests.get(
-                    self.grader_endpoint,
-                    params=query,
-                    proxies=proxies,
-                    headers=grader_headers,
-                    timeout=25,
-                )
-                grader_failed = self.grader_response_failed(grader_response)
-                if grader_failed:
-                    return grader_failed
-                else:
-                    grade, reasons = self.process_grader_response(grader_response)
-        except Exception as e:
+            # Credentials and proxies from site configuration, XBlock settings
+            # or Studio, in that order
+            engine = self.grade_engine(context)
+            # a misconfigured block fails without looking the user up
+            result = engine.check() or engine.grade(context.user_identifier)
+        except Exception as e:  # pylint: disable=broad-except
             LOGGER.exception(e)
-            msg = self.i18n_service.gettext(
-                """
-                Something went wrong, please contact the course team.
-                """
+            return self.error_response(
+                "unexpected_error", context.gettext(UNEXPECTED_ERROR_MESSAGE)
             )
-            htmlFormat = Markup("<span>{message}</span>")
-            return {
-                "msg": "Something went wrong, please contact the course team.",
-                "grade": "",
-                "reason": "",
-                "results": "",
-                "htmlFormat": htmlFormat.format(message=msg),
-            }
 
-        reasons_msg = ""
-        for reason in reasons:
-            reasons_msg += "<li>{reason}</li>".format(reason=reason)
-        self.htmlFormat = self.i18n_service.gettext(
-            "You got <span class='grade'>{grade}% </span>"
-            "score for this activity.<br />Explanation: <span class='reason'>"
-            "<ul>{reasons_msg}</ul></span>"
-        ).format(grade=grade, reasons_msg=reasons_msg)
+        if result.code == "busy":
+            return self.busy_response(result.message, engine.limiter.retry_after)
+        if result.status == "error":
+            return self.error_response(result.code, result.message)
+
+        grade = result.grade
+        self.grade = grade
+        self.results = result.results
         # grade the user
         if grade >= 0:
             grade_event = {"value": grade * 1.00 / 100, "max_value": 1}
             self.runtime.publish(self, "grade", grade_event)
 
         return {
+            "version": RESPONSE_VERSION,
+            "status": "success",
             "grade": grade,
-            "reason": reasons,
-            "htmlFormat": self.htmlFormat,
+            "results": result.results,
         }
 
     # workbench while developing your XBlock.
@@ -0,0 +1,164 @@
+"""
+Per-process limits on concurrent calls to external graders.
+
+Every grader host gets a bounded number of concurrent calls. A few more
+callers may wait briefly for a free slot; anyone beyond that, or anyone who
+waited too long, is turned away so that LMS workers aren't all stuck
+waiting on a slow grader.
+
+Limits are read from the XBlock settings the first time a host is seen::
+
+    XBLOCK_SETTINGS["GradeFetcherXBlock"] = {
+        "max_concurrent_requests": 8,
+        "max_concurrent_requests_per_host": {"grader.example.com": 2},
+        "admission_queue_size": 4,
+        "admission_timeout": 0.5,
+        "retry_after": 5,
+    }
+"""
+
+import threading
+
+try:
+    from edx_django_utils.monitoring import set_custom_attribute
+except ImportError:  # pragma: no cover - outside of Open edX
+
+    def set_custom_attribute(key, value):
+        pass
+
+
+DEFAULT_MAX_CONCURRENT_REQUESTS = 8
+DEFAULT_ADMISSION_QUEUE_SIZE = 4
+DEFAULT_ADMISSION_TIMEOUT = 0.5
+DEFAULT_RETRY_AFTER = 5
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+class HostLimiter(object):
+    """
+    A bounded semaphore with a short admission queue for one grader host.
+    """
+
+    def __init__(
+        self,
+        host,
+        limit=DEFAULT_MAX_CONCURRENT_REQUESTS,
+        queue_size=DEFAULT_ADMISSION_QUEUE_SIZE,
+        timeout=DEFAULT_ADMISSION_TIMEOUT,
+        retry_after=DEFAULT_RETRY_AFTER,
+    ):
+        self.host = host
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._semaphore = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    def acquire(self):
+        """
+        Try to get a slot.
+
+        Returns:
+            bool: whether a slot was acquired; if so ``release`` must be called
+        """
+        if self._semaphore.acquire(False):
+            return self._admit()
+        with self._lock:
+            if self.waiting >= self.queue_size:
+                self.rejected += 1
+                return False
+            self.waiting += 1
+        try:
+            acquired = self._semaphore.acquire(True, self.timeout)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        if acquired:
+            return self._admit()
+        with self._lock:
+            self.rejected += 1
+        return False
+
+    def _admit(self):
+        with self._lock:
+            self.in_flight += 1
+            self.admitted += 1
+        return True
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._semaphore.release()
+
+    def metrics(self):
+        """A snapshot of the limiter's state and counters"""
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+            }
+
+    def report(self, admitted):
+        """Record this call's outcome as custom monitoring attributes"""
+        set_custom_attribute("gradefetcher.grader_host", self.host)
+        set_custom_attribute("gradefetcher.queue_depth", self.waiting)
+        set_custom_attribute("gradefetcher.in_flight", self.in_flight)
+        set_custom_attribute("gradefetcher.rejected", not admitted)
+
+
+def _build_limiter(host, settings_bucket):
+    per_host = settings_bucket.get("max_concurrent_requests_per_host") or {}
+    return HostLimiter(
+        host,
+        limit=per_host.get(
+            host,
+            settings_bucket.get(
+                "max_concurrent_requests", DEFAULT_MAX_CONCURRENT_REQUESTS
+            ),
+        ),
+        queue_size=settings_bucket.get(
+            "admission_queue_size", DEFAULT_ADMISSION_QUEUE_SIZE
+        ),
+        timeout=settings_bucket.get("admission_timeout", DEFAULT_ADMISSION_TIMEOUT),
+        retry_after=settings_bucket.get("retry_after", DEFAULT_RETRY_AFTER),
+    )
+
+
+def get_limiter(host, get_settings_bucket):
+    """
+    Get the limiter of a grader host, creating it on first use.
+
+    Args:
+        host (str): the grader host name
+        get_settings_bucket (callable): returns the XBlock settings bucket,
+            only called when the host has no limiter yet
+    """
+    limiter = _limiters.get(host)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(host)
+            if limiter is None:
+                limiter = _build_limiter(host, get_settings_bucket() or {})
+                _limiters[host] = limiter
+    return limiter
+
+
+def limiter_metrics():
+    """Metrics of every grader host seen by this process, keyed by host"""
+    return {host: limiter.metrics() for host, limiter in list(_limiters.items())}
+
+
+def reset_limiters():
+    """Forget all limiters, e.g. after changing the limits in the settings"""
+    with _limiters_lock:
+        _limiters.clear()
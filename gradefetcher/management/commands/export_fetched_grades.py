@@ -0,0 +1,60 @@
+"""
+Export what the external grader says versus what Open edX recorded.
+
+Example::
+
+    ./manage.py lms export_fetched_grades course-v1:Org+Course+Run --format jsonl \
+        --fetch --workers 8 --output /tmp/grades.jsonl
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gradefetcher.export import CHUNK_SIZE, WRITERS, export_course_grades
+
+
+class Command(BaseCommand):
+    help = (
+        "Export one row per learner and gradefetcher block of a course with "
+        "the stored grade and results, and optionally a freshly fetched grade."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("course_id")
+        parser.add_argument("--format", choices=sorted(WRITERS), default="csv")
+        parser.add_argument("--output", help="File to write to, stdout by default")
+        parser.add_argument(
+            "--fetch",
+            action="store_true",
+            help="Also fetch each learner's current grade from the grader",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="How many grader calls to make at once with --fetch",
+        )
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        from opaque_keys import InvalidKeyError  # pylint: disable=import-error
+        from opaque_keys.edx.keys import CourseKey  # pylint: disable=import-error
+
+        try:
+            course_key = CourseKey.from_string(options["course_id"])
+        except InvalidKeyError:
+            raise CommandError("Invalid course id: {}".format(options["course_id"]))
+
+        chunks = export_course_grades(
+            course_key,
+            output_format=options["format"],
+            fetch=options["fetch"],
+            chunk_size=options["chunk_size"],
+            workers=options["workers"],
+        )
+        if options["output"]:
+            with open(options["output"], "w", newline="") as output:
+                for chunk in chunks:
+                    output.write(chunk)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
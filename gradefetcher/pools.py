@@ -0,0 +1,117 @@
+"""
+Process-wide HTTP sessions and access tokens shared between requests.
+
+Both are keyed by the resolved GraderConfig, so blocks and sites which
+resolve to the same credentials and proxies reuse the same connections and
+tokens, while different tenants never share them. Sessions serve many
+learners, so they never store cookies.
+"""
+
+import http.cookiejar
+import threading
+import time
+
+import requests
+
+from .recording import transport_from_settings
+
+# Refresh tokens this many seconds before the grader says they expire
+TOKEN_EXPIRY_MARGIN = 30
+
+_UNSET = object()
+
+_sessions = {}
+_tokens = {}
+_transport = _UNSET
+_lock = threading.Lock()
+
+
+def get_session(config, get_settings_bucket=None):
+    """
+    Get the shared requests.Session for ``config``.
+
+    Args:
+        get_settings_bucket (callable): returns the XBlock settings bucket,
+            only called once per process to set up a recording or replay
+            transport (see ``gradefetcher.recording``)
+    """
+    global _transport
+    session = _sessions.get(config)
+    if session is None:
+        with _lock:
+            session = _sessions.get(config)
+            if session is None:
+                if _transport is _UNSET and get_settings_bucket is not None:
+                    _transport = transport_from_settings(get_settings_bucket() or {})
+                session = requests.Session()
+                # cookies set for one learner must not be sent for the next
+                session.cookies.set_policy(
+                    http.cookiejar.DefaultCookiePolicy(allowed_domains=[])
+                )
+                session.proxies.update(dict(config.proxies))
+                if _transport not in (_UNSET, None):
+                    session.mount("http://", _transport)
+                    session.mount("https://", _transport)
+                _sessions[config] = session
+    return session
+
+
+def set_transport(adapter):
+    """
+    Send all grader traffic through ``adapter``, e.g. a ReplayAdapter.
+
+    Existing sessions are closed; ``None`` restores the default transport.
+    """
+    global _transport
+    clear_pools()
+    with _lock:
+        _transport = adapter
+
+
+def get_token(config, session, timeout=10):
+    """
+    Get an access token from the authentication endpoint of ``config``.
+
+    Tokens are reused until shortly before they expire. Tokens without an
+    ``expires_in`` are not cached.
+    """
+    cached = _tokens.get(config)
+    if cached is not None and cached[1] > time.time():
+        return cached[0]
+
+    auth_response = session.post(
+        config.authentication_endpoint,
+        auth=(config.client_id, config.client_secret),
+        headers={"Accept": "application/json"},
+        data={
+            "grant_type": "password",
+            "username": config.authentication_username,
+            "password": config.authentication_password,
+        },
+        timeout=timeout,
+    )
+    payload = auth_response.json()
+    token = payload["access_token"]
+    expires_in = payload.get("expires_in")
+    if expires_in:
+        _tokens[config] = (token, time.time() + int(expires_in) - TOKEN_EXPIRY_MARGIN)
+    return token
+
+
+def forget_token(config):
+    """Drop the cached token of ``config``, e.g. after the grader rejected it"""
+    _tokens.pop(config, None)
+
+
+def clear_pools():
+    """Close all shared sessions and forget all tokens"""
+    with _lock:
+        for session in _sessions.values():
+            # the shared record or replay adapter outlives the sessions
+            # using it, the default ones are closed with their session
+            for prefix, adapter in list(session.adapters.items()):
+                if adapter is _transport:
+                    del session.adapters[prefix]
+            session.close()
+        _sessions.clear()
+        _tokens.clear()
@@ -0,0 +1,168 @@
+"""
+Opt-in profiling of the XBlock's views and handlers.
+
+When enabled in the XBlock settings, a sampled fraction of the calls to the
+wrapped methods runs under cProfile. Each profiled call writes a pstats dump
+and a text summary of its top functions to ``directory``, and the oldest
+files are removed once the directory grows beyond ``max_bytes``::
+
+    XBLOCK_SETTINGS["GradeFetcherXBlock"] = {
+        "profiling": {
+            "directory": "/var/tmp/gradefetcher-profiles",
+            "sample_rate": 0.05,
+            "course_ids": ["course-v1:Org+Course+Run"],  # optional
+            "block_ids": [],  # optional
+            "top": 30,
+            "max_bytes": 50 * 1024 * 1024,
+        },
+    }
+
+The settings are read on the first call; call ``reset_profiling`` to pick up
+changes. Profiling is disabled when ``directory`` isn't set.
+"""
+
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+import random
+import re
+import threading
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_SAMPLE_RATE = 0.01
+DEFAULT_TOP = 30
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+
+_UNSET = object()
+
+_profiling = _UNSET
+_profiling_lock = threading.Lock()
+_rotation_lock = threading.Lock()
+
+
+class ProfilingSettings(object):
+    """The parsed ``profiling`` XBlock setting"""
+
+    def __init__(self, settings):
+        self.directory = settings["directory"]
+        self.sample_rate = settings.get("sample_rate", DEFAULT_SAMPLE_RATE)
+        self.course_ids = frozenset(settings.get("course_ids") or ())
+        self.block_ids = frozenset(settings.get("block_ids") or ())
+        self.top = settings.get("top", DEFAULT_TOP)
+        self.max_bytes = settings.get("max_bytes", DEFAULT_MAX_BYTES)
+
+    def should_profile(self, block):
+        if random.random() >= self.sample_rate:
+            return False
+        if self.course_ids and course_id(block) not in self.course_ids:
+            return False
+        if self.block_ids and block_id(block) not in self.block_ids:
+            return False
+        return True
+
+
+def course_id(block):
+    usage_id = getattr(block.scope_ids, "usage_id", None)
+    return str(getattr(usage_id, "course_key", ""))
+
+
+def block_id(block):
+    return str(getattr(block.scope_ids, "usage_id", ""))
+
+
+def get_profiling(block):
+    """
+    The ProfilingSettings of this process, or None when profiling is off.
+    """
+    global _profiling
+    if _profiling is _UNSET:
+        with _profiling_lock:
+            if _profiling is _UNSET:
+                try:
+                    settings = (block.get_settings() or {}).get("profiling") or {}
+                except Exception as e:  # pylint: disable=broad-except
+                    # never let the profiling switch break a view
+                    LOGGER.warning("Could not read the profiling settings: %s", e)
+                    settings = {}
+                _profiling = (
+                    ProfilingSettings(settings) if settings.get("directory") else None
+                )
+    return _profiling
+
+
+def reset_profiling():
+    """Read the profiling settings again on the next call"""
+    global _profiling
+    with _profiling_lock:
+        _profiling = _UNSET
+
+
+def profiled(func):
+    """
+    Run a sampled fraction of the calls to an XBlock method under cProfile.
+    """
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        profiling = get_profiling(self)
+        if profiling is None or not profiling.should_profile(self):
+            return func(self, *args, **kwargs)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # another profiler is already running in this process
+            return func(self, *args, **kwargs)
+        try:
+            return func(self, *args, **kwargs)
+        finally:
+            profiler.disable()
+            try:
+                write_profile(profiling, profiler, func.__name__, block_id(self))
+            except Exception as e:  # pylint: disable=broad-except
+                LOGGER.warning("Could not write profile of %s: %s", func.__name__, e)
+
+    return wrapper
+
+
+def write_profile(profiling, profiler, name, block):
+    """Write the pstats dump and top-N summary of a profiled call"""
+    os.makedirs(profiling.directory, exist_ok=True)
+    prefix = os.path.join(
+        profiling.directory,
+        "{timestamp}.{microseconds:06d}-{pid}-{name}-{block}".format(
+            timestamp=time.strftime("%Y%m%dT%H%M%S"),
+            microseconds=int(time.time() * 1000000) % 1000000,
+            pid=os.getpid(),
+            name=name,
+            block=re.sub(r"[^\w.-]+", "_", block)[-80:],
+        ),
+    )
+    profiler.dump_stats(prefix + ".prof")
+    summary = io.StringIO()
+    stats = pstats.Stats(profiler, stream=summary)
+    stats.sort_stats("cumulative").print_stats(profiling.top)
+    with open(prefix + ".txt", "w") as summary_file:
+        summary_file.write(summary.getvalue())
+    rotate(profiling.directory, profiling.max_bytes)
+
+
+def rotate(directory, max_bytes):
+    """Remove the oldest profiles until ``directory`` fits in ``max_bytes``"""
+    with _rotation_lock:
+        files = []
+        for entry in os.scandir(directory):
+            if entry.is_file() and entry.name.endswith((".prof", ".txt")):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.path, stat.st_size))
+        total = sum(size for _mtime, _path, size in files)
+        for _mtime, path, size in sorted(files):
+            if total <= max_bytes:
+                break
+            os.remove(path)
+            total -= size
@@ -0,0 +1,228 @@
+"""
+Record and replay of grader traffic.
+
+``RecordingAdapter`` writes every authentication and grader exchange to a
+JSON lines file, with secrets redacted, learner identifiers replaced by
+hashes salted per recording, and the time each call took. The grader gets
+the learner's identifier in a query parameter whose name is configured per
+block, so every query value is hashed.
+``ReplayAdapter`` serves such a file back, with latencies drawn from the
+ones recorded for each endpoint, so performance tests can run offline
+against realistic payloads.
+
+Both are opt-in through the XBlock settings, and only one can be active::
+
+    XBLOCK_SETTINGS["GradeFetcherXBlock"] = {
+        "record_grader_traffic": "/tmp/grader-traffic.jsonl",
+        # or
+        "replay_grader_traffic": "/tmp/grader-traffic.jsonl",
+    }
+
+or from code with ``pools.set_transport(ReplayAdapter(path))``.
+"""
+
+import collections
+import hashlib
+import itertools
+import json
+import os
+import random
+import threading
+import time
+import urllib.parse
+
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+
+REDACTED = "[REDACTED]"
+REDACTED_HEADERS = frozenset(["authorization", "x-api-key", "cookie", "set-cookie"])
+REDACTED_KEYS = frozenset(
+    [
+        "password",
+        "client_secret",
+        "access_token",
+        "refresh_token",
+        "id_token",
+        "api_key",
+    ]
+)
+# body fields holding a learner identifier, e.g. echoed back by the grader
+IDENTIFYING_KEYS = frozenset(["email", "username", "user_id", "anonymous_student_id"])
+
+
+def pseudonymize(value, salt=b""):
+    """A stable stand-in for ``value``, which can't be reversed without ``salt``"""
+    digest = hashlib.sha256(salt + str(value).encode("utf-8")).hexdigest()
+    return "hash:" + digest[:16]
+
+
+def redact_value(key, value, salt=b""):
+    if key in REDACTED_KEYS:
+        return REDACTED
+    if key in IDENTIFYING_KEYS:
+        return pseudonymize(value, salt)
+    return value
+
+
+def redact_headers(headers):
+    return {
+        name: REDACTED if name.lower() in REDACTED_HEADERS else value
+        for name, value in headers.items()
+    }
+
+
+def redact_json(value, salt=b""):
+    if isinstance(value, dict):
+        return {
+            key: redact_json(redact_value(key, item, salt), salt)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [redact_json(item, salt) for item in value]
+    return value
+
+
+def redact_body(body, salt=b""):
+    """Redact a request or response body, JSON or form encoded"""
+    if body is None:
+        return None
+    if isinstance(body, bytes):
+        body = body.decode("utf-8", "replace")
+    try:
+        return json.dumps(redact_json(json.loads(body), salt))
+    except ValueError:
+        pass
+    fields = urllib.parse.parse_qsl(body, keep_blank_values=True)
+    if fields and "=" in body:
+        return urllib.parse.urlencode(
+            [(key, redact_value(key, value, salt)) for key, value in fields]
+        )
+    return body
+
+
+def redact_url(url, salt=b""):
+    """Redact secrets in the query and hash every other query value"""
+    parts = urllib.parse.urlsplit(url)
+    query = urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+    query = [
+        (key, REDACTED if key in REDACTED_KEYS else pseudonymize(value, salt))
+        for key, value in query
+    ]
+    return urllib.parse.urlunsplit(parts._replace(query=urllib.parse.urlencode(query)))
+
+
+def endpoint_key(method, url):
+    """Recordings are matched on the method and the url without its query"""
+    parts = urllib.parse.urlsplit(url)
+    return "{} {}://{}{}".format(method.upper(), parts.scheme, parts.netloc, parts.path)
+
+
+class RecordingAdapter(HTTPAdapter):
+    """
+    A transport adapter which sends requests as usual and appends each
+    exchange to ``path``.
+    """
+
+    def __init__(self, path, *args, **kwargs):
+        super(RecordingAdapter, self).__init__(*args, **kwargs)
+        self.path = path
+        # the same learner gets the same hash within a recording only
+        self.salt = os.urandom(16)
+        self._lock = threading.Lock()
+
+    def send(self, request, *args, **kwargs):
+        started = time.time()
+        response = super(RecordingAdapter, self).send(request, *args, **kwargs)
+        elapsed = time.time() - started
+        self.record(request, response, elapsed)
+        return response
+
+    def record(self, request, response, elapsed):
+        exchange = {
+            "endpoint": endpoint_key(request.method, request.url),
+            "method": request.method,
+            "url": redact_url(request.url, self.salt),
+            "request_headers": redact_headers(request.headers),
+            "request_body": redact_body(request.body, self.salt),
+            "status_code": response.status_code,
+            "response_headers": redact_headers(response.headers),
+            "response_body": redact_body(response.content, self.salt),
+            "elapsed": elapsed,
+        }
+        line = json.dumps(exchange) + "\n"
+        with self._lock:
+            with open(self.path, "a") as recording:
+                recording.write(line)
+
+
+class ReplayAdapter(BaseAdapter):
+    """
+    A transport adapter which answers requests from a recording.
+
+    Responses recorded for an endpoint are served in turn. Each one is
+    delayed by a latency drawn at random from the ones recorded for that
+    endpoint, scaled by ``speed`` (``speed=0`` disables the delays).
+    """
+
+    def __init__(self, path, speed=1.0, seed=None):
+        super(ReplayAdapter, self).__init__()
+        self.speed = speed
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        exchanges = collections.defaultdict(list)
+        with open(path) as recording:
+            for line in recording:
+                if line.strip():
+                    exchange = json.loads(line)
+                    exchanges[exchange["endpoint"]].append(exchange)
+        self.latencies = {
+            endpoint: [exchange["elapsed"] for exchange in recorded]
+            for endpoint, recorded in exchanges.items()
+        }
+        self._responses = {
+            endpoint: itertools.cycle(recorded)
+            for endpoint, recorded in exchanges.items()
+        }
+
+    def send(self, request, *args, **kwargs):
+        endpoint = endpoint_key(request.method, request.url)
+        with self._lock:
+            if endpoint not in self._responses:
+                raise LookupError("No recorded exchange for {}".format(endpoint))
+            exchange = next(self._responses[endpoint])
+            latency = self._random.choice(self.latencies[endpoint])
+        if self.speed:
+            time.sleep(latency / self.speed)
+        return self.build_response(request, exchange)
+
+    def build_response(self, request, exchange):
+        response = Response()
+        response.status_code = exchange["status_code"]
+        response.headers = CaseInsensitiveDict(exchange["response_headers"])
+        # the recorded body is decoded and may have been redacted
+        for header in ("Content-Encoding", "Content-Length", "Transfer-Encoding"):
+            response.headers.pop(header, None)
+        response._content = (exchange["response_body"] or "").encode("utf-8")
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def close(self):
+        pass
+
+
+def transport_from_settings(settings_bucket):
+    """
+    Build the adapter enabled in the XBlock settings, if any.
+
+    Returns:
+        BaseAdapter or None
+    """
+    if settings_bucket.get("replay_grader_traffic"):
+        return ReplayAdapter(settings_bucket["replay_grader_traffic"])
+    if settings_bucket.get("record_grader_traffic"):
+        return RecordingAdapter(settings_bucket["record_grader_traffic"])
+    return None
@@ -1,26 +1,79 @@
 /* Javascript for GradeFetcherXBlock. */
-function GradeFetcherXBlock(runtime, element) {
+function GradeFetcherXBlock(runtime, element, initArgs) {
 
-    function updateGrade(result) {
-        $('.block-description', element).html(result.htmlFormat);
-        $(".block-button-loading").css('display', 'none');
-        $("#grade-me").css('display', "block")
+    var messages = initArgs.messages;
+    var handlerUrl = runtime.handlerUrl(element, 'grade_user');
+
+    function escapeHtml(value) {
+        return $('<div/>').text(value === undefined ? '' : String(value)).html();
     }
 
-    var handlerUrl = runtime.handlerUrl(element, 'grade_user');
+    function format(template, values) {
+        return template.replace(/\{(\w+)\}/g, function(match, key) {
+            return values.hasOwnProperty(key) ? values[key] : match;
+        });
+    }
+
+    function renderResult(result) {
+        var reason = escapeHtml(result.reason);
+        var assignmentId = escapeHtml(result.assignment_id);
+        var template = messages[result.outcome] || messages.info;
+        return '<li>' + format(template, {
+            assignment_id: assignmentId,
+            id: assignmentId,
+            reason: reason,
+            reason_api_text: reason
+        }) + '</li>';
+    }
+
+    function render(response) {
+        if (response.status !== 'success') {
+            return '<span>' + escapeHtml(response.msg) + '</span>';
+        }
+        return format(messages.summary, {
+            grade: escapeHtml(response.grade),
+            reasons_msg: $.map(response.results, renderResult).join('')
+        });
+    }
+
+    function updateGrade(response) {
+        $('.block-description', element).html(render(response));
+        $('.block-button-loading', element).css('display', 'none');
+        $('#grade-me', element).css('display', 'block');
+    }
+
+    function gradeFailed(xhr) {
+        var response = xhr.responseJSON || {status: 'error', msg: messages.error};
+        // the grader is busy: keep the button disabled for as long as asked
+        var retryAfter = parseInt(xhr.getResponseHeader('Retry-After'), 10) ||
+            response.retry_after;
+        updateGrade(response);
+        if (retryAfter) {
+            $('#grade-me', element).prop('disabled', true);
+            setTimeout(function() {
+                $('#grade-me', element).prop('disabled', false);
+            }, retryAfter * 1000);
+        }
+    }
 
     $('#grade-me', element).click(
         function(eventObject) {
-            $(".block-button-loading").css('display', 'block'),
-            $("#grade-me").css('display', "none"),
+            $('.block-button-loading', element).css('display', 'block');
+            $('#grade-me', element).css('display', 'none');
             $.ajax({
                 type: "POST",
                 url: handlerUrl,
                 data: JSON.stringify({}),
-                success: updateGrade
+                dataType: 'json',
+                success: updateGrade,
+                error: gradeFailed
             });
         });
 
     $(function ($) {
+        // the last result stored in the learner's state
+        if (initArgs.result) {
+            $('.block-description', element).html(render(initArgs.result));
+        }
     });
 }
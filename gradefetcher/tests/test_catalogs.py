@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import django
+from django.utils import translation
+from mock import Mock, patch
+from xblock.field_data import DictFieldData
+from xblock.test.tools import TestRuntime
+
+from gradefetcher import catalogs, engine
+from gradefetcher.context import RequestContext
+from gradefetcher.gradefetcher import GradeFetcherXBlock
+from gradefetcher.tests.test_gradefetcher import StubI18n
+
+django.setup()
+
+
+class CatalogsTests(unittest.TestCase):
+    def test_catalogs_are_compiled(self):
+        assert catalogs.check_catalogs() == []
+
+    def test_every_locale_is_compiled(self):
+        assert {"ar", "en", "es_419", "fr", "fr_CA"} <= set(
+            catalogs.available_locales()
+        )
+
+    def test_check_finds_missing_and_stale_catalogs(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        translations = os.path.join(directory, "translations")
+        shutil.copytree(catalogs.TRANSLATIONS_DIR, translations)
+        with patch.object(catalogs, "TRANSLATIONS_DIR", translations):
+            with open(catalogs.po_path("fr"), "a", encoding="utf-8") as po_file:
+                po_file.write('\nmsgid "New message"\nmsgstr "Nouveau message"\n')
+            os.remove(catalogs.mo_path("ar"))
+            assert catalogs.check_catalogs() == [("ar", "missing"), ("fr", "stale")]
+
+    def test_ui_messages_are_translated(self):
+        block = GradeFetcherXBlock(
+            TestRuntime(services={"field-data": DictFieldData({}), "i18n": StubI18n()}),
+            DictFieldData({}),
+            Mock(),
+        )
+        with translation.override("en"):
+            messages = list(block.result_messages().values())
+        messages += [
+            engine.BUSY_MESSAGE,
+            "Grader endpoint is not a valid url",
+            "Authentication endpoint is not a valid url",
+        ]
+        for locale in ("fr", "fr_CA", "es_419", "ar"):
+            catalog = catalogs.get_catalog(locale)
+            for message in messages:
+                assert catalog.get(message), (locale, message)
+
+    def test_catalog_is_loaded_once(self):
+        assert catalogs.get_catalog("fr") is catalogs.get_catalog("fr")
+        assert catalogs.get_catalog("fr")["Passed"] == "Réussi"
+
+    def test_locale_falls_back_to_language(self):
+        assert catalogs.get_catalog("fr_BE") == catalogs.get_catalog("fr")
+        assert catalogs.get_catalog("xx") == {}
+
+    def test_context_uses_active_catalog(self):
+        block = GradeFetcherXBlock(
+            TestRuntime(services={"field-data": DictFieldData({}), "i18n": StubI18n()}),
+            DictFieldData({}),
+            Mock(),
+        )
+        with translation.override("fr"):
+            context = RequestContext(block)
+            assert context.gettext("Passed") == "Réussi"
+            assert context.gettext("Not in the catalog") == "Not in the catalog"
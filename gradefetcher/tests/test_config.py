@@ -0,0 +1,85 @@
+import contextlib
+import unittest
+
+import django
+from mock import Mock, patch
+from xblock.field_data import DictFieldData
+from xblock.test.tools import TestRuntime
+
+from gradefetcher.config import invalidate_grader_config, resolve_grader_config
+from gradefetcher.gradefetcher import GradeFetcherXBlock
+from openedx.core.djangoapps.site_configuration import helpers
+
+django.setup()
+
+
+class GraderConfigTests(unittest.TestCase):
+    def setUp(self):
+        invalidate_grader_config()
+        self.addCleanup(invalidate_grader_config)
+        self.block = GradeFetcherXBlock(
+            TestRuntime(services={"field-data": DictFieldData({})}),
+            DictFieldData({}),
+            Mock(),
+        )
+        self.block.client_id = "block_client_id"
+        self.block.authentication_username = "block_username"
+        self.settings_bucket = {
+            "client_id": "settings_client_id",
+            "proxies": {"https": "https://proxy.example.com"},
+        }
+        self.get_settings_bucket = Mock(return_value=self.settings_bucket)
+
+    def test_layers(self):
+        # the stub site configuration sets USERNAME and PASSWORD
+        config = resolve_grader_config(self.block, self.get_settings_bucket)
+        assert config.authentication_username == "foo"
+        assert config.authentication_password == "bar"
+        assert config.client_id == "settings_client_id"
+        assert config.client_secret == ""
+        assert config.proxies == (("https", "https://proxy.example.com"),)
+
+    @contextlib.contextmanager
+    def on_site(self, domain, site_configuration):
+        """Make ``domain`` the current site, configured with ``site_configuration``"""
+        with patch(
+            "gradefetcher.config.get_current_request",
+            return_value=Mock(site=Mock(domain=domain)),
+        ), patch.dict(helpers.configurations, {"GRADE_FETCHER": site_configuration}):
+            yield
+
+    def test_site_layer_is_cached_until_invalidated(self):
+        with self.on_site("lms.example.com", {"USERNAME": "foo"}):
+            resolve_grader_config(self.block, self.get_settings_bucket)
+            self.settings_bucket["client_id"] = "changed"
+            config = resolve_grader_config(self.block, self.get_settings_bucket)
+            assert config.client_id == "settings_client_id"
+            assert self.get_settings_bucket.call_count == 1
+
+            invalidate_grader_config()
+            config = resolve_grader_config(self.block, self.get_settings_bucket)
+            assert config.client_id == "changed"
+            assert self.get_settings_bucket.call_count == 2
+
+    def test_tenants_without_site_name(self):
+        with self.on_site("a.example.com", {"USERNAME": "tenantA"}):
+            config = resolve_grader_config(self.block, self.get_settings_bucket)
+        assert config.authentication_username == "tenantA"
+        with self.on_site("b.example.com", {"USERNAME": "tenantB"}):
+            config = resolve_grader_config(self.block, self.get_settings_bucket)
+        assert config.authentication_username == "tenantB"
+
+    def test_site_configuration_without_current_site_is_not_cached(self):
+        with patch.dict(helpers.configurations, {"GRADE_FETCHER": {"USERNAME": "a"}}):
+            resolve_grader_config(self.block, self.get_settings_bucket)
+        with patch.dict(helpers.configurations, {"GRADE_FETCHER": {"USERNAME": "b"}}):
+            config = resolve_grader_config(self.block, self.get_settings_bucket)
+        assert config.authentication_username == "b"
+
+    def test_sites_are_cached_separately(self):
+        resolve_grader_config(self.block, self.get_settings_bucket, site="a")
+        resolve_grader_config(self.block, self.get_settings_bucket, site="b")
+        assert self.get_settings_bucket.call_count == 2
+        invalidate_grader_config("a")
+        resolve_grader_config(self.block, self.get_settings_bucket, site="b")
+        assert self.get_settings_bucket.call_count == 2
@@ -0,0 +1,107 @@
+import unittest
+
+import django
+from mock import Mock, patch
+from xblock.field_data import DictFieldData
+
+from gradefetcher.config import invalidate_grader_config
+from gradefetcher.context import RequestContext
+from gradefetcher.gradefetcher import GradeFetcherXBlock
+from gradefetcher.limits import reset_limiters
+from gradefetcher.tests.test_gradefetcher import StubI18n, request_wrap
+
+django.setup()
+
+
+class RequestContextTests(unittest.TestCase):
+    def setUp(self):
+        self.user = Mock(
+            emails=["test@example.com"],
+            opt_attrs={
+                "edx-platform.user_id": 7,
+                "edx-platform.username": "test",
+            },
+        )
+        self.i18n = StubI18n()
+        self.services = {
+            "i18n": self.i18n,
+            "user": Mock(get_current_user=Mock(return_value=self.user)),
+            "settings": Mock(
+                get_settings_bucket=Mock(return_value={"proxies": {}}),
+            ),
+        }
+        self.runtime = Mock(
+            service=Mock(side_effect=lambda block, name: self.services[name]),
+            anonymous_student_id="anon",
+        )
+        self.block = GradeFetcherXBlock(
+            self.runtime,
+            DictFieldData({}),
+            Mock(),
+        )
+
+    def test_services_are_resolved_once(self):
+        context = RequestContext(self.block)
+        for _ in range(3):
+            context.gettext("text")
+            context.settings  # pylint: disable=pointless-statement
+        requested = [call[0][1] for call in self.runtime.service.call_args_list]
+        assert requested.count("i18n") == 1
+        assert requested.count("settings") == 1
+
+    def test_only_configured_user_identifier_is_computed(self):
+        self.block.user_identifier = "anonymous_student_id"
+        context = RequestContext(self.block)
+        assert context.user_identifier == "anon"
+        requested = [call[0][1] for call in self.runtime.service.call_args_list]
+        assert "user" not in requested
+
+    def test_user_identifiers(self):
+        for identifier, expected in (
+            ("email", "test@example.com"),
+            ("username", "test"),
+            ("user_id", 7),
+        ):
+            self.block.user_identifier = identifier
+            assert RequestContext(self.block).user_identifier == expected
+
+    # the profiling switch is read once per process, not per request
+    @patch("gradefetcher.profiling.get_profiling", Mock(return_value=None))
+    @patch("gradefetcher.engine.get_session")
+    def test_grade_user_resolves_services_once(self, mock_get_session):
+        invalidate_grader_config()
+        reset_limiters()
+        self.addCleanup(reset_limiters)
+        mock_get_session.return_value.get.return_value = Mock(
+            status_code=200,
+            json=Mock(
+                return_value={
+                    "results": [
+                        {"assignment_id": 1, "grade": 1},
+                        {"assignment_id": 2, "grade": 0, "reason": "Nope"},
+                        {"assignment_id": 3, "reason": "Info"},
+                    ]
+                }
+            ),
+        )
+        self.block.grader_endpoint = "https://www.example.com/"
+        response = self.block.grade_user(request_wrap())
+        assert response.json["status"] == "success"
+        assert response.json["grade"] == 50
+        assert self.block.grade == 50
+        assert len(self.block.results) == 3
+        requested = [call[0][1] for call in self.runtime.service.call_args_list]
+        assert requested.count("i18n") == 1
+        assert requested.count("settings") == 1
+        assert requested.count("user") == 1
+        params = mock_get_session.return_value.get.call_args[1]["params"]
+        assert params["email"] == "test@example.com"
+
+    def test_grade_user_without_email(self):
+        invalidate_grader_config()
+        self.user.emails = []
+        self.block.grader_endpoint = "https://www.example.com/"
+        with self.assertLogs("gradefetcher", "ERROR"):
+            response = self.block.grade_user(request_wrap())
+        assert response.json["status"] == "error"
+        assert response.json["code"] == "unexpected_error"
@@ -0,0 +1,220 @@
+import pickle
+import threading
+import time
+import unittest
+
+import django
+from mock import Mock, patch
+
+from gradefetcher.config import GraderConfig
+from gradefetcher.engine import (
+    GradeEngine,
+    GraderEndpoint,
+    grade_users,
+    grader_failure,
+    parse_results,
+)
+from gradefetcher.limits import HostLimiter
+
+django.setup()
+
+CONFIG = GraderConfig("", "", "", "", "", "", ())
+ENDPOINT = GraderEndpoint(
+    "https://grader.example.com/grade", "get", "email", "unit_id", "unit", "a=1"
+)
+
+
+def grader_answer(email):
+    """A grader passing users whose name starts with "pass" """
+    if email.startswith("unknown"):
+        return Mock(status_code=404, json=Mock(return_value={}))
+    grade = 1 if email.startswith("pass") else 0
+    return Mock(
+        status_code=200,
+        json=Mock(
+            return_value={
+                "results": [{"assignment_id": 1, "grade": grade, "reason": "Wrong"}]
+            }
+        ),
+    )
+
+
+def untranslated(text):
+    return text
+
+
+class GraderAnswerTests(unittest.TestCase):
+    def test_grader_failure_grader_error(self):
+        payload = {
+            "errorMessage": "local variable 'users_object' referenced before assignment",
+            "errorType": "UnboundLocalError",
+            "status": "error",
+        }
+        code, msg = grader_failure(500, payload, untranslated)
+        assert code == "grader_error"
+        assert msg == "local variable 'users_object' referenced before assignment"
+
+    def test_grader_failure_account_not_found(self):
+        payload = {
+            "errorMessage": "We couldn't find your account",
+            "errorType": "accountDoesNotExist",
+            "status": "error",
+        }
+        code, msg = grader_failure(404, payload, untranslated)
+        assert code == "account_not_found"
+        assert (
+            msg
+            == """
+                    We cannot find your account. Please make sure
+                    that you have created your account. If you need
+                    assistance, please contact the course team.
+                    """
+        )
+
+    def test_grader_failure_with_results(self):
+        assert grader_failure(200, {"results": []}, untranslated) is None
+
+    def test_parse_results(self):
+        payload = {
+            "results": [
+                {
+                    "resultOrder": 1,
+                    "resultName": "Create one or more organisation units.",
+                    "assignment_id": 1,
+                    "grade": 1,
+                    "reason": "Passed",
+                },
+                {
+                    "resultOrder": 2,
+                    "resultName": "Create a Data Set.",
+                    "assignment_id": 2,
+                    "grade": 0,
+                    "reason": "Your data set is not yet assigned.",
+                },
+                {
+                    "resultOrder": 3,
+                    "resultName": "Enter data on the data set.",
+                    "assignment_id": 3,
+                    "grade": 0,
+                    "reason": "You haven't assigned your data elements",
+                },
+            ],
+            "username": "test@example.com",
+        }
+        grade, results = parse_results(payload, untranslated)
+        assert grade == 33
+        assert len(results) == 3
+        assert results[0] == {"assignment_id": 1, "outcome": "passed"}
+        assert results[1] == {
+            "assignment_id": 2,
+            "outcome": "failed",
+            "reason": "Your data set is not yet assigned.",
+        }
+
+    def test_parse_results_without_grade(self):
+        payload = {
+            "results": [
+                {"assignment_id": 4, "reason": "Does not affect your grade."},
+            ],
+        }
+        grade, results = parse_results(payload, untranslated)
+        assert grade == 0
+        assert results == [
+            {
+                "assignment_id": 4,
+                "outcome": "info",
+                "reason": "Does not affect your grade.",
+            }
+        ]
+
+
+class GradeEngineTests(unittest.TestCase):
+    def setUp(self):
+        patcher = patch("gradefetcher.engine.get_session")
+        self.session = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.session.get.side_effect = lambda url, params, **kwargs: grader_answer(
+            params["email"]
+        )
+        self.engine = GradeEngine(CONFIG, ENDPOINT)
+
+    def test_grade(self):
+        result = self.engine.grade("pass@example.com")
+        assert result.status == "success"
+        assert result.grade == 100
+        assert result.results == [{"assignment_id": 1, "outcome": "passed"}]
+        assert self.session.get.call_args[1]["params"] == {
+            "email": "pass@example.com",
+            "unit_id": "unit",
+            "a": ["1"],
+        }
+
+    def test_grade_errors(self):
+        result = self.engine.grade("unknown@example.com")
+        assert (result.status, result.code) == ("error", "account_not_found")
+        self.session.get.side_effect = ValueError
+        result = self.engine.grade("pass@example.com")
+        assert (result.status, result.code) == ("error", "unexpected_error")
+
+    def test_invalid_configuration(self):
+        engine = GradeEngine(CONFIG, ENDPOINT._replace(grader_endpoint="grader"))
+        result = engine.grade("pass@example.com")
+        assert result.code == "invalid_grader_endpoint"
+        assert engine.check().code == "invalid_grader_endpoint"
+        assert self.engine.check() is None
+        self.session.get.assert_not_called()
+
+    def test_grade_many_keeps_order(self):
+        emails = ["pass{}@example.com".format(i) for i in range(20)]
+        emails[7] = "fail@example.com"
+        results = list(self.engine.grade_many(iter(emails), workers=4))
+        assert [result.user_identifier for result in results] == emails
+        assert [result.grade for result in results].count(0) == 1
+        assert results[7].grade == 0
+
+    def test_grade_many_runs_concurrently(self):
+        threads = set()
+
+        def slow_answer(url, params, **kwargs):
+            threads.add(threading.current_thread().name)
+            time.sleep(0.01)
+            return grader_answer(params["email"])
+
+        self.session.get.side_effect = slow_answer
+        emails = ["pass{}@example.com".format(i) for i in range(8)]
+        assert len(list(self.engine.grade_many(emails, workers=4))) == 8
+        assert len(threads) > 1
+
+    def test_grade_many_is_lazy(self):
+        consumed = []
+
+        def emails():
+            for i in range(100):
+                consumed.append(i)
+                yield "pass{}@example.com".format(i)
+
+        results = self.engine.grade_many(emails(), workers=2, window=4)
+        next(results)
+        assert len(consumed) <= 5
+        results.close()
+
+    def test_limiter_sheds_load(self):
+        limiter = HostLimiter("grader.example.com", limit=1, queue_size=0)
+        assert limiter.acquire()
+        engine = GradeEngine(CONFIG, ENDPOINT, limiter=limiter)
+        assert engine.grade("pass@example.com").code == "busy"
+        limiter.release()
+        assert engine.grade("pass@example.com").status == "success"
+
+    def test_pickle(self):
+        engine = GradeEngine(
+            CONFIG, ENDPOINT, gettext=lambda text: text, language="fr", limiter=Mock()
+        )
+        copy = pickle.loads(pickle.dumps(engine))
+        assert copy.limiter is None
+        assert copy.endpoint == ENDPOINT
+        assert copy.translate("Wrong") == "Wrong"
+
+    def test_grade_users(self):
+        results = grade_users(CONFIG, ENDPOINT, ["pass@example.com", "fail@x.com"])
+        assert [result.grade for result in results] == [100, 0]
@@ -0,0 +1,184 @@
+import csv
+import io
+import json
+import unittest
+
+import django
+from mock import Mock, patch
+
+from gradefetcher import config
+from gradefetcher.config import invalidate_grader_config
+from gradefetcher.engine import GradeResult, error_result
+from gradefetcher.export import (
+    EXPORT_FIELDS,
+    FreshGradeFetcher,
+    csv_chunks,
+    export_rows,
+    jsonl_chunks,
+)
+from openedx.core.djangoapps.site_configuration import helpers
+
+django.setup()
+
+
+def student_module(user_id, state, grade=None, max_grade=None):
+    return Mock(
+        course_id="course-v1:Org+Course+Run",
+        module_state_key="block-v1:Org+Course+Run+type@gradefetcher+block@{}".format(
+            user_id % 2
+        ),
+        student=Mock(id=user_id, username="user{}".format(user_id)),
+        state=json.dumps(state),
+        grade=grade,
+        max_grade=max_grade,
+    )
+
+
+class ExportTests(unittest.TestCase):
+    def setUp(self):
+        self.results = [{"assignment_id": 1, "outcome": "passed"}]
+        self.modules = [
+            student_module(1, {"grade": 100, "results": self.results}, 1.0, 1.0),
+            student_module(2, {}),
+        ]
+
+    def test_export_rows(self):
+        rows = list(export_rows(self.modules))
+        assert rows[0]["recorded_grade"] == 100
+        assert rows[0]["stored_grade"] == 100
+        assert rows[0]["results"] == self.results
+        assert rows[0]["fetched_grade"] is None
+        assert rows[1]["recorded_grade"] is None
+        assert rows[1]["stored_grade"] is None
+        assert rows[1]["results"] == []
+
+    def test_export_rows_with_fetch(self):
+        results = [
+            GradeResult("user1", "success", 50, [], None, None),
+            error_result("user2", "account_not_found", "We cannot find you"),
+        ]
+        fetcher = Mock()
+        fetcher.fetch_many.return_value = zip(self.modules, results)
+        rows = list(export_rows(self.modules, fetcher, workers=4))
+        fetcher.fetch_many.assert_called_once_with(self.modules, workers=4)
+        assert rows[0]["fetched_grade"] == 50
+        assert rows[0]["fetch_error"] is None
+        assert rows[1]["fetched_grade"] is None
+        assert rows[1]["fetch_error"] == "account_not_found"
+
+    def test_export_rows_is_lazy(self):
+        modules = iter(self.modules)
+        rows = export_rows(modules)
+        next(rows)
+        assert next(modules) is self.modules[1]
+
+    def test_csv_chunks(self):
+        modules = [student_module(user_id, {"grade": 0}) for user_id in range(5)]
+        chunks = list(csv_chunks(export_rows(modules), chunk_size=2))
+        assert len(chunks) == 3
+        rows = list(csv.DictReader(io.StringIO("".join(chunks))))
+        assert len(rows) == 5
+        assert tuple(rows[0]) == EXPORT_FIELDS
+        assert json.loads(rows[0]["results"]) == []
+
+    def test_jsonl_chunks(self):
+        chunks = list(jsonl_chunks(export_rows(self.modules), chunk_size=1))
+        lines = "".join(chunks).splitlines()
+        assert len(lines) == 2
+        assert json.loads(lines[0])["results"] == self.results
+
+
+class FreshGradeFetcherTests(unittest.TestCase):
+    def setUp(self):
+        invalidate_grader_config()
+        self.addCleanup(invalidate_grader_config)
+        self.block = Mock(
+            user_identifier="username",
+            get_settings=Mock(return_value={}),
+            grader_endpoint="https://grader.example.com/grade",
+            http_method="get",
+            user_identifier_parameter="username",
+            activity_identifier_parameter="unit_id",
+            activity_identifier="unit",
+            **{
+                field: ""
+                for field in (
+                    "authentication_endpoint",
+                    "client_id",
+                    "client_secret",
+                    "authentication_username",
+                    "authentication_password",
+                    "api_key",
+                    "extra_params",
+                )
+            }
+        )
+        patcher = patch("gradefetcher.engine.get_session")
+        self.session = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.get_block = Mock(return_value=self.block)
+        self.fetch = FreshGradeFetcher(Mock(org="Org"), self.get_block)
+
+    def test_fetches_grade(self):
+        self.session.get.return_value.json.return_value = {
+            "results": [{"grade": 1}, {"grade": 0, "reason": "no"}, {"reason": "info"}]
+        }
+        assert self.fetch(student_module(1, {})).grade == 50
+        assert self.session.get.call_args[1]["params"] == {
+            "username": "user1",
+            "unit_id": "unit",
+        }
+
+    def test_uses_the_course_site_configuration(self):
+        self.session.get.return_value.json.return_value = {"results": []}
+        with patch.dict(
+            helpers.org_configurations,
+            {"Org": {"GRADE_FETCHER": {"USERNAME": "org_user"}}},
+        ):
+            self.fetch(student_module(1, {}))
+        _block, engine = self.fetch.block(student_module(1, {}).module_state_key)
+        assert engine.config.authentication_username == "org_user"
+        # web requests of the course's site don't share this cache entry
+        assert "" not in config._site_layers
+
+    def test_loads_each_block_once(self):
+        self.session.get.return_value.json.return_value = {"results": []}
+        self.fetch(student_module(1, {}))
+        self.fetch(student_module(3, {}))
+        assert self.get_block.call_count == 1
+
+    def test_grader_error(self):
+        self.session.get.return_value.json.return_value = {
+            "errorMessage": "Unknown user"
+        }
+        result = self.fetch(student_module(1, {}))
+        assert (result.status, result.code) == ("error", "account_not_found")
+
+    def test_fetch_many_per_block(self):
+        self.session.get.side_effect = lambda url, params, **kwargs: Mock(
+            json=Mock(
+                return_value={
+                    "results": [
+                        {"grade": int(params["username"] != "user3"), "reason": "no"}
+                    ]
+                }
+            )
+        )
+        # ordered by block, as iter_student_modules does when fetching
+        modules = [student_module(user_id, {}) for user_id in (2, 4, 1, 3, 5)]
+        fetched = list(self.fetch.fetch_many(iter(modules), workers=2))
+        assert [module for module, _result in fetched] == modules
+        assert [result.grade for _module, result in fetched] == [100, 100, 100, 0, 100]
+        assert self.get_block.call_count == 2
+
+    def test_fetch_many_without_user_identifier(self):
+        self.session.get.return_value.json.return_value = {"results": [{"grade": 1}]}
+        modules = [student_module(user_id, {}) for user_id in (1, 3, 5)]
+        modules[1].student = None
+        fetched = list(self.fetch.fetch_many(modules, workers=2))
+        assert [module for module, _result in fetched] == modules
+        assert [result.code for _module, result in fetched] == [
+            None,
+            "unexpected_error",
+            None,
+        ]
@@ -11,10 +11,6 @@ from gradefetcher.gradefetcher import GradeFetcherXBlock, grade_from_list
 django.setup()
 
 
-class DummyFieldData(object):
-    pass
-
-
 class StubRuntime(object):
     """fake runtime that returns our other fake services"""
 
@@ -22,9 +18,10 @@ class StubRuntime(object):
     def service(self, service):
         services = {
             "i18n": StubI18n(),
-            "field-data": DummyFieldData(),
+            "field-data": DictFieldData({}),
         }
-        return services[service]
+        # like real runtimes, there's no settings service to be had
+        return services.get(service)
 
 
 class StubJSONRequest(object):
@@ -145,8 +142,9 @@ class GradeFetcherHelperTests(unittest.TestCase):
         block.authentication_endpoint = "None"
         block.get_settings = Mock(return_value=self.settings_bucket)
         response = block.grade_user(request_wrap())
-        assert response.json["message"] == "Authentication endpoint is not a valid url"
+        assert response.json["msg"] == "Authentication endpoint is not a valid url"
         assert response.json["status"] == "error"
+        assert response.json["code"] == "invalid_authentication_endpoint"
 
     def test_grade_user_invalid_grader_endpoint(self):
         runtime = TestRuntime(
@@ -155,82 +153,24 @@ class GradeFetcherHelperTests(unittest.TestCase):
         block = GradeFetcherXBlock(runtime=runtime, scope_ids=None)
         block.grader_endpoint = "None"
         block.get_settings = Mock(return_value=self.settings_bucket)
-        response = block.grade_user(request_wrap())
+        with self.assertLogs("gradefetcher", "WARNING") as logs:
+            response = block.grade_user(request_wrap())
+        assert len(logs.output) == 1
         assert response.json["msg"] == "Grader endpoint is not a valid url"
         assert response.json["status"] == "error"
-
-    def test_grader_response_failed(self):
-        grader_response = Mock()
-        grader_response.json = Mock(
-            return_value={
-                "errorMessage": "local variable 'users_object' referenced before assignment",
-                "errorType": "UnboundLocalError",
-                "status": "error",
-            }
-        )
-        grader_response.status_code = 500
-        response = self.block.grader_response_failed(grader_response)
-        assert response["status"] == "error"
-        assert (
-            response["msg"]
-            == "local variable 'users_object' referenced before assignment"
-        )
-
-    def test_grade_without_account(self):
-        grader_response = Mock()
-        grader_response.json = Mock(
-            return_value={
-                "errorMessage": "We couldn't find your account",
-                "errorType": "accountDoesNotExist",
-                "status": "error",
-            }
-        )
-        grader_response.status_code = 404
-        response = self.block.grader_response_failed(grader_response)
-        assert response["status"] == "error"
-        assert (
-            response["msg"]
-            == """
-                    We cannot find your account. Please make sure
-                    that you have created your account. If you need
-                    assistance, please contact the course team.
-                    """
-        )
-
-    def test_grade_user_sucess(self):
-        grader_response = Mock()
-        grader_response.json = Mock(
-            return_value={
-                "results": [
-                    {
-                        "resultOrder": 1,
-                        "resultName": "Create one or more organisation units.",
-                        "assignment_id": 1,
-                        "grade": 1,
-                        "reason": "Passed",
-                    },
-                    {
-                        "resultOrder": 2,
-                        "resultName": "Create a Data Set.",
-                        "assignment_id": 2,
-                        "grade": 0,
-                        "reason": "Your data set is not yet assigned.",
-                    },
-                    {
-                        "resultOrder": 3,
-                        "resultName": "Enter data on the data set.",
-                        "assignment_id": 3,
-                        "grade": 0,
-                        "reason": "You haven't assigned your data elements",
-                    },
-                ],
-                "username": "test@example.com",
-            }
-        )
-        grader_response.status_code = 200
-        grade, reasons = self.block.process_grader_response(grader_response)
-        assert grade == 33
-        assert len(reasons) == 3
+        assert set(response.json) == {"version", "status", "code", "msg"}
+
+    def test_student_view_init_args(self):
+        init_args = self.block.student_view().json_init_args
+        assert init_args["result"] is None
+        self.block.grade = 50
+        self.block.results = [{"assignment_id": 1, "outcome": "passed"}]
+        init_args = self.block.student_view().json_init_args
+        assert init_args["result"]["grade"] == 50
+
+    def test_result_messages_cover_outcomes(self):
+        messages = self.block.result_messages()
+        assert set(messages) == {"summary", "passed", "failed", "info", "error"}
 
     def test_rejects_invalid_grader_endpoint(self):
         block = GradeFetcherXBlock(runtime=StubRuntime(), scope_ids=None)
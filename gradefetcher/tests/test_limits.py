@@ -0,0 +1,112 @@
+import json
+import threading
+import unittest
+
+import django
+from mock import Mock, patch
+from xblock.field_data import DictFieldData
+
+from gradefetcher.config import invalidate_grader_config
+from gradefetcher.gradefetcher import GradeFetcherXBlock
+from gradefetcher.limits import (
+    HostLimiter,
+    get_limiter,
+    limiter_metrics,
+    reset_limiters,
+)
+
+django.setup()
+
+
+class HostLimiterTests(unittest.TestCase):
+    def test_admits_up_to_limit(self):
+        limiter = HostLimiter("grader.example.com", limit=2, queue_size=0)
+        assert limiter.acquire()
+        assert limiter.acquire()
+        assert not limiter.acquire()
+        limiter.release()
+        assert limiter.acquire()
+        assert limiter.metrics() == {
+            "limit": 2,
+            "in_flight": 2,
+            "waiting": 0,
+            "admitted": 3,
+            "rejected": 1,
+        }
+
+    def test_waits_for_a_slot(self):
+        limiter = HostLimiter("grader.example.com", limit=1, queue_size=1, timeout=5)
+        assert limiter.acquire()
+        timer = threading.Timer(0.05, limiter.release)
+        timer.start()
+        assert limiter.acquire()
+        timer.join()
+
+    def test_times_out_waiting(self):
+        limiter = HostLimiter("grader.example.com", limit=1, queue_size=1, timeout=0.01)
+        assert limiter.acquire()
+        assert not limiter.acquire()
+        assert limiter.metrics()["rejected"] == 1
+        assert limiter.metrics()["waiting"] == 0
+
+
+class GetLimiterTests(unittest.TestCase):
+    def setUp(self):
+        reset_limiters()
+        self.addCleanup(reset_limiters)
+
+    def test_limits_from_settings(self):
+        get_settings_bucket = Mock(
+            return_value={
+                "max_concurrent_requests": 3,
+                "max_concurrent_requests_per_host": {"slow.example.com": 1},
+                "retry_after": 30,
+            }
+        )
+        slow = get_limiter("slow.example.com", get_settings_bucket)
+        other = get_limiter("other.example.com", get_settings_bucket)
+        assert slow.limit == 1
+        assert slow.retry_after == 30
+        assert other.limit == 3
+        assert get_limiter("slow.example.com", get_settings_bucket) is slow
+        assert get_settings_bucket.call_count == 2
+        assert set(limiter_metrics()) == {"slow.example.com", "other.example.com"}
+
+
+class GradeUserLoadSheddingTests(unittest.TestCase):
+    def setUp(self):
+        reset_limiters()
+        invalidate_grader_config()
+        self.addCleanup(reset_limiters)
+        self.addCleanup(invalidate_grader_config)
+        self.runtime = Mock(
+            service=Mock(
+                side_effect=lambda block, name: {
+                    "i18n": Mock(gettext=lambda text: text),
+                    "settings": Mock(get_settings_bucket=Mock(return_value={})),
+                }[name]
+            ),
+            anonymous_student_id="anon",
+        )
+        self.block = GradeFetcherXBlock(self.runtime, DictFieldData({}), Mock())
+        self.block.grader_endpoint = "https://grader.example.com/"
+        self.block.user_identifier = "anonymous_student_id"
+
+    @patch("gradefetcher.engine.get_session")
+    def test_sheds_load_when_saturated(self, mock_get_session):
+        request = Mock(method="POST", body=b"{}")
+        limiter = get_limiter(
+            "grader.example.com",
+            lambda: {"max_concurrent_requests": 1, "retry_after": 7},
+        )
+        limiter.acquire()
+        try:
+            response = self.block.grade_user(request)
+        finally:
+            limiter.release()
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "7"
+        payload = json.loads(response.body.decode("utf-8"))
+        assert payload["code"] == "busy"
+        assert payload["retry_after"] == 7
+        mock_get_session.assert_not_called()
@@ -0,0 +1,65 @@
+import http.client
+import unittest
+
+import requests
+from mock import Mock, patch
+from requests.cookies import MockRequest, MockResponse
+
+from gradefetcher import pools
+from gradefetcher.config import GraderConfig
+
+
+class PoolsTests(unittest.TestCase):
+    def setUp(self):
+        pools.clear_pools()
+        self.addCleanup(pools.clear_pools)
+        self.config = GraderConfig(
+            "https://auth.example.com/", "id", "secret", "user", "pass", "", ()
+        )
+
+    def test_sessions_are_shared_per_config(self):
+        session = pools.get_session(self.config)
+        assert pools.get_session(self.config) is session
+        assert pools.get_session(self.config._replace(client_id="other")) is not session
+
+    def test_clear_pools_closes_default_adapters(self):
+        adapter = pools.get_session(self.config).get_adapter("https://")
+        with patch.object(adapter, "close") as close:
+            pools.clear_pools()
+        close.assert_called_once_with()
+
+    def test_clear_pools_keeps_shared_transport(self):
+        transport = Mock()
+        pools.set_transport(transport)
+        self.addCleanup(pools.set_transport, None)
+        assert pools.get_session(self.config).get_adapter("https://") is transport
+        pools.clear_pools()
+        transport.close.assert_not_called()
+
+    def test_sessions_do_not_store_cookies(self):
+        session = pools.get_session(self.config)
+        headers = http.client.HTTPMessage()
+        headers["Set-Cookie"] = "session=learner1; Path=/"
+        request = requests.Request("GET", "https://grader.example.com/").prepare()
+        session.cookies.extract_cookies(MockResponse(headers), MockRequest(request))
+        assert not session.cookies
+
+    def test_tokens_are_cached_until_forgotten(self):
+        session = Mock()
+        session.post.return_value.json.return_value = {
+            "access_token": "token",
+            "expires_in": 3600,
+        }
+        assert pools.get_token(self.config, session) == "token"
+        assert pools.get_token(self.config, session) == "token"
+        assert session.post.call_count == 1
+        pools.forget_token(self.config)
+        pools.get_token(self.config, session)
+        assert session.post.call_count == 2
+
+    def test_tokens_without_expiry_are_not_cached(self):
+        session = Mock()
+        session.post.return_value.json.return_value = {"access_token": "token"}
+        pools.get_token(self.config, session)
+        pools.get_token(self.config, session)
+        assert session.post.call_count == 2
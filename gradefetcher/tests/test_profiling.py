@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import Mock
+
+from gradefetcher.profiling import profiled, reset_profiling, rotate
+
+
+class ProfiledBlock(object):
+    def __init__(self, settings, usage_id="block-v1:Org+Course+Run+type@gradefetcher"):
+        self.settings = settings
+        self.scope_ids = Mock(usage_id=Mock(course_key="course-v1:Org+Course+Run"))
+        self.scope_ids.usage_id.__str__ = Mock(return_value=usage_id)
+
+    def get_settings(self):
+        return self.settings
+
+    @profiled
+    def student_view(self, context=None):
+        return sum(range(100))
+
+
+class ProfilingTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        reset_profiling()
+        self.addCleanup(reset_profiling)
+
+    def profiles(self):
+        return sorted(os.listdir(self.directory))
+
+    def test_disabled_by_default(self):
+        assert ProfiledBlock({}).student_view() == 4950
+        assert self.profiles() == []
+
+    def test_writes_dump_and_summary(self):
+        block = ProfiledBlock(
+            {"profiling": {"directory": self.directory, "sample_rate": 1, "top": 5}}
+        )
+        assert block.student_view() == 4950
+        profiles = self.profiles()
+        assert [name.rsplit(".", 1)[1] for name in profiles] == ["prof", "txt"]
+        assert "student_view" in profiles[0]
+        with open(os.path.join(self.directory, profiles[1])) as summary:
+            assert "function calls" in summary.read()
+
+    def test_sample_rate(self):
+        block = ProfiledBlock(
+            {"profiling": {"directory": self.directory, "sample_rate": 0}}
+        )
+        block.student_view()
+        assert self.profiles() == []
+
+    def test_scoped_to_course_and_block(self):
+        settings = {
+            "profiling": {
+                "directory": self.directory,
+                "sample_rate": 1,
+                "course_ids": ["course-v1:Other+Course+Run"],
+            }
+        }
+        ProfiledBlock(settings).student_view()
+        assert self.profiles() == []
+
+        reset_profiling()
+        settings["profiling"]["course_ids"] = ["course-v1:Org+Course+Run"]
+        settings["profiling"]["block_ids"] = ["block-v1:Org+Course+Run+type@other"]
+        ProfiledBlock(settings).student_view()
+        assert self.profiles() == []
+        ProfiledBlock(settings, "block-v1:Org+Course+Run+type@other").student_view()
+        assert len(self.profiles()) == 2
+
+    def test_broken_settings_disable_profiling(self):
+        block = ProfiledBlock({})
+        block.get_settings = Mock(side_effect=KeyError("settings"))
+        assert block.student_view() == 4950
+        assert self.profiles() == []
+
+    def test_rotate(self):
+        for index in range(4):
+            path = os.path.join(self.directory, "{}.prof".format(index))
+            with open(path, "w") as profile:
+                profile.write("x" * 10)
+            os.utime(path, (index, index))
+        rotate(self.directory, 25)
+        assert self.profiles() == ["2.prof", "3.prof"]
@@ -0,0 +1,158 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import urllib.parse
+
+import django
+import requests
+from mock import Mock, patch
+from requests.adapters import HTTPAdapter
+from xblock.field_data import DictFieldData
+
+from gradefetcher import pools
+from gradefetcher.config import GraderConfig, invalidate_grader_config
+from gradefetcher.gradefetcher import GradeFetcherXBlock
+from gradefetcher.limits import reset_limiters
+from gradefetcher.recording import (
+    REDACTED,
+    RecordingAdapter,
+    ReplayAdapter,
+    redact_body,
+    redact_url,
+    transport_from_settings,
+)
+
+django.setup()
+
+GRADER_ENDPOINT = "https://grader.example.com/grade"
+AUTH_ENDPOINT = "https://auth.example.com/token"
+
+
+def fake_send(request, *args, **kwargs):
+    """Stands in for the network behind RecordingAdapter"""
+    response = requests.Response()
+    response.status_code = 200
+    response.headers["Content-Type"] = "application/json"
+    response.headers["Set-Cookie"] = "session=secret"
+    if request.url.startswith(AUTH_ENDPOINT):
+        body = {"access_token": "secret-token", "expires_in": 3600}
+    else:
+        body = {"results": [{"assignment_id": 1, "grade": 1}]}
+    response._content = json.dumps(body).encode("utf-8")
+    response.request = request
+    response.url = request.url
+    return response
+
+
+class RecordReplayTests(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, "traffic.jsonl")
+        self.config = GraderConfig(
+            AUTH_ENDPOINT, "client", "client-secret", "user", "password", "key", ()
+        )
+        self.addCleanup(pools.set_transport, None)
+
+    def record(self):
+        pools.set_transport(RecordingAdapter(self.path))
+        with patch.object(HTTPAdapter, "send", side_effect=fake_send):
+            session = pools.get_session(self.config)
+            token = pools.get_token(self.config, session)
+            session.get(
+                GRADER_ENDPOINT,
+                params={"email": "test@example.com"},
+                headers={"Authorization": "Bearer " + token, "x-api-key": "key"},
+            )
+        with open(self.path) as recording:
+            return [json.loads(line) for line in recording]
+
+    def test_records_with_secrets_redacted(self):
+        auth, grader = self.record()
+        assert auth["endpoint"] == "POST " + AUTH_ENDPOINT
+        assert auth["request_headers"]["Authorization"] == REDACTED
+        assert urllib.parse.parse_qs(auth["request_body"])["password"] == [REDACTED]
+        assert json.loads(auth["response_body"]) == {
+            "access_token": REDACTED,
+            "expires_in": 3600,
+        }
+        assert auth["response_headers"]["Set-Cookie"] == REDACTED
+        assert grader["endpoint"] == "GET " + GRADER_ENDPOINT
+        assert grader["request_headers"]["x-api-key"] == REDACTED
+        assert json.loads(grader["response_body"])["results"][0]["grade"] == 1
+        assert grader["elapsed"] >= 0
+        with open(self.path) as recording:
+            content = recording.read()
+        for secret in ("secret-token", "session=secret", "Basic ", "Bearer "):
+            assert secret not in content
+
+    def test_records_hashed_learner_identifiers(self):
+        _auth, grader = self.record()
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(grader["url"]).query)
+        assert query["email"][0].startswith("hash:")
+        with open(self.path) as recording:
+            content = recording.read()
+        assert "test@example.com" not in content
+        assert "test%40example.com" not in content
+        salt = b"salt"
+        assert redact_url(GRADER_ENDPOINT + "?email=a", salt) == redact_url(
+            GRADER_ENDPOINT + "?email=a", salt
+        )
+        assert redact_body('{"username": "learner"}', salt) != '{"username": "learner"}'
+
+    def test_replays_recording(self):
+        self.record()
+        pools.set_transport(ReplayAdapter(self.path, speed=0))
+        session = pools.get_session(self.config)
+        response = session.get(GRADER_ENDPOINT, params={"email": "other@example.com"})
+        assert response.status_code == 200
+        assert response.json()["results"][0]["grade"] == 1
+        assert pools.get_token(self.config, session) == REDACTED
+
+    def test_replay_unknown_endpoint(self):
+        self.record()
+        pools.set_transport(ReplayAdapter(self.path, speed=0))
+        session = pools.get_session(self.config)
+        with self.assertRaises(LookupError):
+            session.get("https://unknown.example.com/")
+
+    def test_replay_latencies(self):
+        self.record()
+        replay = ReplayAdapter(self.path, speed=2.0, seed=1)
+        with patch("gradefetcher.recording.time.sleep") as sleep:
+            replay.send(Mock(method="GET", url=GRADER_ENDPOINT + "?email=x"))
+        recorded = replay.latencies["GET " + GRADER_ENDPOINT][0]
+        sleep.assert_called_once_with(recorded / 2.0)
+
+    def test_transport_from_settings(self):
+        assert transport_from_settings({}) is None
+        assert isinstance(
+            transport_from_settings({"record_grader_traffic": self.path}),
+            RecordingAdapter,
+        )
+
+    def test_grade_user_against_replay(self):
+        self.record()
+        invalidate_grader_config()
+        reset_limiters()
+        self.addCleanup(invalidate_grader_config)
+        self.addCleanup(reset_limiters)
+        pools.set_transport(ReplayAdapter(self.path, speed=0))
+        runtime = Mock(
+            service=Mock(
+                side_effect=lambda block, name: {
+                    "i18n": Mock(gettext=lambda text: text),
+                    "settings": Mock(get_settings_bucket=Mock(return_value={})),
+                }[name]
+            ),
+            anonymous_student_id="anon",
+        )
+        block = GradeFetcherXBlock(runtime, DictFieldData({}), Mock())
+        block.grader_endpoint = GRADER_ENDPOINT
+        block.authentication_endpoint = AUTH_ENDPOINT
+        block.user_identifier = "anonymous_student_id"
+        response = block.grade_user(Mock(method="POST", body=b"{}"))
+        assert response.json["status"] == "success"
+        assert response.json["grade"] == 100
@@ -3,6 +3,13 @@
 
 configurations = {"GRADE_FETCHER": {'USERNAME': 'foo', 'PASSWORD': 'bar'}}
 
+# org -> configuration of the site serving that org
+org_configurations = {}
+
 
 def get_value(value, default=None):
     return configurations.get(value, default)
+
+
+def get_value_for_org(org, val_name, default=None):
+    return org_configurations.get(org, {}).get(val_name, default)